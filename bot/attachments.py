@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import io
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+import discord
+from bot.config import cfg
+from utils.image import shrink_image_async
+
+
+logger = logging.getLogger(__name__)
+
+MAX_FILES_PER_MESSAGE = 10
+# Room left for multipart framing and the rest of the message payload
+UPLOAD_HEADROOM = 64 * 1024
+
+
+def upload_limit(channel) -> int:
+    """Bytes that can be uploaded in one message to ``channel``."""
+    limit = cfg.discord_upload_limit_bytes
+    guild = getattr(channel, "guild", None)
+    if guild is not None:
+        limit = min(limit, guild.filesize_limit)
+    return max(limit - UPLOAD_HEADROOM, 1)
+
+
+def pack_batches(files: Sequence[Tuple[str, bytes]], max_bytes: int,
+                 max_files: int = MAX_FILES_PER_MESSAGE) -> List[List[Tuple[str, bytes]]]:
+    """Split ``files`` into consecutive batches within both count and byte limits."""
+    batches: List[List[Tuple[str, bytes]]] = []
+    current: List[Tuple[str, bytes]] = []
+    current_bytes = 0
+    for name, data in files:
+        if current and (len(current) >= max_files or current_bytes + len(data) > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append((name, data))
+        current_bytes += len(data)
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def fit_files(files: Sequence[Tuple[str, bytes]], max_bytes: int,
+                    executor=None) -> List[Tuple[str, bytes]]:
+    """Re-encode files larger than ``max_bytes`` so each can be uploaded."""
+    fitted = []
+    for name, data in files:
+        if len(data) > max_bytes:
+            shrunk = await shrink_image_async(bytes(data), max_bytes, executor=executor)
+            logger.info(f"🗜️ Shrunk {name} from {len(data)} to {len(shrunk)} bytes to fit the upload limit")
+            if not name.lower().endswith((".jpg", ".jpeg")):
+                name = name.rsplit(".", 1)[0] + ".jpg"
+            data = shrunk
+        fitted.append((name, data))
+    return fitted
+
+
+def signed_url_expiry(url: str) -> Optional[float]:
+    """Unix time a signed Discord CDN URL expires (its ``ex`` parameter), if any."""
+    ex = parse_qs(urlsplit(url).query).get("ex")
+    try:
+        return int(ex[0], 16) if ex else None
+    except ValueError:
+        return None
+
+
+class AttachmentCache:
+    """Uploads images once to a staging channel and hands out their CDN URLs.
+
+    Posts that go to several channels embed the returned URLs instead of
+    re-uploading the same bytes to every target. URLs are cached by SHA-256 of
+    the content. Discord CDN links are signed and expire (``ex=``), so an
+    entry is only handed out for ``ttl`` seconds and never closer than
+    ``refresh_margin`` to its expiry; after that the staging message is
+    fetched again for freshly signed URLs, and the file is only re-uploaded
+    if that fails. Concurrent requests for the same content share one upload.
+    """
+
+    def __init__(self, dispatcher, ttl: float = 6 * 3600, max_entries: int = 512, executor=None,
+                 refresh_margin: float = 3600):
+        self.dispatcher = dispatcher
+        self.executor = executor
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        # key -> (url, usable until (monotonic), staging message id, attachment index)
+        self._urls: "OrderedDict[str, Tuple[str, float, int, int]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.uploads = 0
+        self.refreshed = 0
+        self.uploaded_bytes = 0
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _cached(self, key: str) -> Optional[str]:
+        entry = self._urls.get(key)
+        if entry is None or time.monotonic() >= entry[1]:
+            # Expired entries are kept: their message can be refreshed
+            return None
+        self._urls.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key: str, url: str, message_id: int, index: int):
+        now = time.monotonic()
+        usable_until = now + self.ttl
+        expires = signed_url_expiry(url)
+        if expires is not None:
+            usable_until = min(usable_until, now + expires - time.time() - self.refresh_margin)
+        self._urls[key] = (url, usable_until, message_id, index)
+        self._urls.move_to_end(key)
+        while len(self._urls) > self.max_entries:
+            self._urls.popitem(last=False)
+
+    def _resolve(self, key: str, url: str, message_id: int, index: int):
+        self._store(key, url, message_id, index)
+        future = self._pending.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(url)
+
+    async def url_for(self, staging, filename: str, data: bytes) -> str:
+        return (await self.urls_for(staging, [(filename, data)]))[0]
+
+    async def urls_for(self, staging, files: Sequence[Tuple[str, bytes]]) -> List[str]:
+        """CDN URLs for ``files`` (in order), uploading only what is not cached."""
+        keys = [self.key(bytes(data)) for _, data in files]
+        # URLs known now; cache entries may expire or be evicted while we upload
+        known: Dict[str, str] = {}
+        waits: Dict[str, asyncio.Future] = {}
+        to_refresh = []
+        to_upload = []
+        for key, (filename, data) in zip(keys, files):
+            if key in known or key in waits:
+                continue
+            url = self._cached(key)
+            if url is not None:
+                self.hits += 1
+                known[key] = url
+                continue
+            if key in self._pending:
+                waits[key] = self._pending[key]
+                self.hits += 1
+                continue
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = waits[key] = future
+            entry = self._urls.get(key)
+            if entry is not None:
+                to_refresh.append((key, filename, data, entry[2], entry[3]))
+            else:
+                to_upload.append((key, filename, data))
+
+        try:
+            to_upload += await self._refresh(staging, to_refresh)
+            limit = upload_limit(staging)
+            fitted = await fit_files([(name, data) for _, name, data in to_upload], limit, self.executor)
+            # The content key travels with each file through packing
+            keyed = [((key, name), data) for (key, _, _), (name, data) in zip(to_upload, fitted)]
+            for batch in pack_batches(keyed, limit):
+                await self._upload(staging, [(key, name, data) for (key, name), data in batch])
+        except BaseException as e:
+            for key, *_ in to_refresh + to_upload:
+                self._fail(key, e)
+            raise
+
+        return [known[key] if key in known else await asyncio.shield(waits[key]) for key in keys]
+
+    async def _refresh(self, staging, items):
+        """Re-sign expired URLs from their staging messages; returns the items to re-upload."""
+        fetch_message = getattr(staging, "fetch_message", None)
+        if fetch_message is None:
+            return [(key, filename, data) for key, filename, data, _, _ in items]
+        by_message: Dict[int, list] = {}
+        for item in items:
+            by_message.setdefault(item[3], []).append(item)
+
+        stale = []
+        for message_id, group in by_message.items():
+            try:
+                message = await fetch_message(message_id)
+            except discord.HTTPException as e:
+                logger.warning(f"Cannot refresh staged attachments of message {message_id}, re-uploading: {e}")
+                message = None
+            for key, filename, data, _, index in group:
+                if message is None or index >= len(message.attachments):
+                    stale.append((key, filename, data))
+                    continue
+                self._resolve(key, message.attachments[index].url, message_id, index)
+                self.refreshed += 1
+        return stale
+
+    async def _upload(self, staging, batch):
+        size = sum(len(data) for _, _, data in batch)
+        message = await self.dispatcher.send(
+            staging,
+            lambda: {"files": [discord.File(io.BytesIO(data), filename=name) for _, name, data in batch]},
+            label="staging upload",
+            size=size,
+        )
+        if len(message.attachments) != len(batch):
+            raise RuntimeError(f"Expected {len(batch)} staged attachments, got {len(message.attachments)}")
+
+        self.uploads += 1
+        self.uploaded_bytes += size
+        logger.info(f"📦 Staged {len(batch)} attachments ({size / 1024:.0f} KB) in #{staging.name}")
+        for index, ((key, _, _), attachment) in enumerate(zip(batch, message.attachments)):
+            self._resolve(key, attachment.url, message.id, index)
+
+    def _fail(self, key: str, error: BaseException):
+        future = self._pending.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(error)
+            # Mark retrieved: there may be no other waiter to see it
+            future.exception()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._urls),
+            "hits": self.hits,
+            "uploads": self.uploads,
+            "refreshed": self.refreshed,
+            "uploaded_bytes": self.uploaded_bytes,
+        }
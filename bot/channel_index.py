@@ -0,0 +1,65 @@
+import logging
+from typing import Dict, List, Optional
+import discord
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelIndex:
+    """Name -> text channel lookup across every guild the bot is in.
+
+    Built once with ``rebuild()`` when the client is ready and then kept in
+    sync from the gateway channel and guild events, so lookups never iterate
+    over guilds. Several guilds may have a channel with the same name; the
+    first one indexed wins, the others are kept as fallbacks.
+    """
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self._by_name: Dict[str, List[discord.TextChannel]] = {}
+
+    def rebuild(self):
+        self._by_name = {}
+        for guild in self.bot.guilds:
+            self.add_guild(guild)
+        logger.debug(f"Channel index built: {len(self._by_name)} names in {len(self.bot.guilds)} guilds")
+
+    def get(self, name: str) -> Optional[discord.TextChannel]:
+        channels = self._by_name.get(name)
+        return channels[0] if channels else None
+
+    def add(self, channel):
+        if not isinstance(channel, discord.TextChannel):
+            return
+        channels = self._by_name.setdefault(channel.name, [])
+        if all(c.id != channel.id for c in channels):
+            channels.append(channel)
+
+    def remove(self, channel, name: Optional[str] = None):
+        name = name or channel.name
+        channels = self._by_name.get(name)
+        if not channels:
+            return
+        channels[:] = [c for c in channels if c.id != channel.id]
+        if not channels:
+            del self._by_name[name]
+
+    def update(self, before, after):
+        self.remove(before, name=before.name)
+        self.add(after)
+
+    def add_guild(self, guild: discord.Guild):
+        for channel in guild.text_channels:
+            self.add(channel)
+
+    def remove_guild(self, guild: discord.Guild):
+        for name in list(self._by_name):
+            channels = [c for c in self._by_name[name] if c.guild.id != guild.id]
+            if channels:
+                self._by_name[name] = channels
+            else:
+                del self._by_name[name]
+
+    def __len__(self):
+        return sum(len(channels) for channels in self._by_name.values())
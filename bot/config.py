@@ -5,6 +5,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _image_format(value: str) -> str:
+    """Normalise IMAGE_FORMAT to the Pillow format name (jpg -> JPEG)."""
+    name = value.strip().upper()
+    name = {"JPG": "JPEG"}.get(name, name)
+    if name not in ("JPEG", "WEBP"):
+        raise ValueError(f"IMAGE_FORMAT must be jpeg or webp, got {value!r}")
+    return name
+
+
 @dataclass
 class Config:
     discord_token: str = os.getenv("DISCORD_TOKEN", "")
@@ -12,15 +21,62 @@ class Config:
     discord_commands_channel_name: str = os.getenv("DISCORD_COMMANDS_CHANNEL_NAME", "admin-commands")
     discord_admin_channel_name: str = os.getenv("DISCORD_ADMIN_CHANNEL_NAME", "admin-logs")
     discord_admin_password: str = os.getenv("DISCORD_ADMIN_PASSWORD", "")
+    discord_send_retries: int = int(os.getenv("DISCORD_SEND_RETRIES", "3"))
+    discord_delivery_mode: str = os.getenv("DISCORD_DELIVERY_MODE", "gateway").strip().lower()  # gateway | webhook
+    discord_webhooks: str = os.getenv("DISCORD_WEBHOOKS", "")  # channel=url,channel2=url2
+    discord_staging_channel_name: str = os.getenv("DISCORD_STAGING_CHANNEL_NAME", "")  # empty = upload to every channel
+    discord_attachment_cache_ttl: int = int(os.getenv("DISCORD_ATTACHMENT_CACHE_TTL", str(6 * 3600)))
+    discord_upload_limit_bytes: int = int(os.getenv("DISCORD_UPLOAD_LIMIT_BYTES", str(10 * 1024 * 1024)))
     poll_interval_seconds: int = int(os.getenv("POLL_INTERVAL_SECONDS", "60"))
+    poll_max_concurrency: int = int(os.getenv("POLL_MAX_CONCURRENCY", "4"))
+    poll_jitter: float = float(os.getenv("POLL_JITTER", "0.1"))  # fraction of the interval
+    adaptive_polling: bool = os.getenv("ADAPTIVE_POLLING", "false").lower() in ("1", "true", "yes")
+    poll_min_interval_seconds: int = int(os.getenv("POLL_MIN_INTERVAL_SECONDS", os.getenv("POLL_INTERVAL_SECONDS", "60")))
+    poll_max_interval_seconds: int = int(os.getenv("POLL_MAX_INTERVAL_SECONDS", "3600"))
+    poll_cadence_factor: float = float(os.getenv("POLL_CADENCE_FACTOR", "0.05"))
     state_file: str = os.getenv("STATE_FILE", "data/state.json")
+    state_backend: str = os.getenv("STATE_BACKEND", "")  # json | sqlite, empty = by STATE_FILE extension
+    state_flush_delay: float = float(os.getenv("STATE_FLUSH_DELAY_SECONDS", "1.0"))
+    state_journal: bool = os.getenv("STATE_JOURNAL", "false").lower() in ("1", "true", "yes")
+    state_journal_max_bytes: int = int(os.getenv("STATE_JOURNAL_MAX_BYTES", str(1024 * 1024)))
+
+    # Dedup index for posted items
+    dedup_recent_max: int = int(os.getenv("DEDUP_RECENT_MAX", "1000"))
+    dedup_recent_max_age_days: float = float(os.getenv("DEDUP_RECENT_MAX_AGE_DAYS", "30"))
+    dedup_bloom_capacity: int = int(os.getenv("DEDUP_BLOOM_CAPACITY", "100000"))
+    dedup_bloom_error_rate: float = float(os.getenv("DEDUP_BLOOM_ERROR_RATE", "0.001"))
+
     deviantart_client_id: str = os.getenv("DEVIANTART_CLIENT_ID", "")
     deviantart_client_secret: str = os.getenv("DEVIANTART_CLIENT_SECRET", "")
     deviantart_usernames: str = os.getenv("DEVIANTART_USERNAMES", "")
+    deviantart_page_size: int = int(os.getenv("DEVIANTART_PAGE_SIZE", "5"))
+    deviantart_max_catchup_pages: int = int(os.getenv("DEVIANTART_MAX_CATCHUP_PAGES", "20"))
+    deviantart_rate_limit_rps: float = float(os.getenv("DEVIANTART_RATE_LIMIT_RPS", "1.0"))
+    deviantart_rate_limit_burst: int = int(os.getenv("DEVIANTART_RATE_LIMIT_BURST", "5"))
+    deviantart_commit_batch: int = int(os.getenv("DEVIANTART_COMMIT_BATCH", "10"))
+
+    # Shared HTTP connection pool
+    http_pool_limit: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    http_pool_limit_per_host: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+    http_dns_cache_seconds: int = int(os.getenv("HTTP_DNS_CACHE_SECONDS", "300"))
     
+    # Image processing (blur, re-encode) off the event loop
+    image_executor: str = os.getenv("IMAGE_EXECUTOR", "process").strip().lower()  # process | thread
+    image_workers: int = int(os.getenv("IMAGE_WORKERS", "0"))  # 0 = one per CPU core
+    blur_fast: bool = os.getenv("BLUR_FAST", "true").lower() in ("1", "true", "yes")
+    blur_preview_width: int = int(os.getenv("BLUR_PREVIEW_WIDTH", "1280"))
+    image_variant_cache_size: int = int(os.getenv("IMAGE_VARIANT_CACHE_SIZE", "32"))
+    image_variant_cache_mb: int = int(os.getenv("IMAGE_VARIANT_CACHE_MB", "64"))
+    image_max_bytes: int = int(os.getenv("IMAGE_MAX_BYTES", "1048576"))  # 0 = send images as they are
+    image_max_dimension: int = int(os.getenv("IMAGE_MAX_DIMENSION", "2560"))  # 0 = keep resolution
+    image_format: str = _image_format(os.getenv("IMAGE_FORMAT", "jpeg"))  # JPEG | WEBP
+    image_quality: int = int(os.getenv("IMAGE_QUALITY", "85"))
+
     # Telegram
     tg_bot_token: str = os.getenv("TG_BOT_TOKEN", "")
     tg_source_channel_id: str = os.getenv("TG_SOURCE_CHANNEL_ID", "")
+    telegram_fanout_concurrency: int = int(os.getenv("TELEGRAM_FANOUT_CONCURRENCY", "4"))
+    telegram_download_concurrency: int = int(os.getenv("TELEGRAM_DOWNLOAD_CONCURRENCY", "5"))
 
     # Patreon
     patreon_access_token: str = os.getenv("PATREON_ACCESS_TOKEN", "")
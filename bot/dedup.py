@@ -0,0 +1,350 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest."""
+
+    HEADER = struct.Struct("<4sIII")  # magic, bit count, hash count, items added
+    MAGIC = b"BLM1"
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytearray] = None,
+                 num_bits: Optional[int] = None, num_hashes: Optional[int] = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        if num_bits is None:
+            num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        if num_hashes is None:
+            num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    def to_bytes(self) -> bytes:
+        return self.HEADER.pack(self.MAGIC, self.num_bits, self.num_hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, capacity: int, error_rate: float) -> "BloomFilter":
+        magic, num_bits, num_hashes, count = cls.HEADER.unpack_from(blob)
+        if magic != cls.MAGIC:
+            raise ValueError("not a bloom filter blob")
+        size = (num_bits + 7) // 8
+        bits = bytearray(blob[cls.HEADER.size:cls.HEADER.size + size])
+        if len(bits) != size:
+            raise ValueError("truncated bloom filter blob")
+        return cls(capacity, error_rate, bits=bits, num_bits=num_bits, num_hashes=num_hashes, count=count)
+
+
+class DedupIndex:
+    """Bounded "already posted?" index for one namespace of keys.
+
+    Two tiers:
+
+    * an exact in-memory set of recent keys (insertion ordered), evicted by
+      count (``max_recent``) and age (``max_age``). It is persisted in the
+      state store under ``dedup:<namespace>:recent``.
+    * a Bloom filter holding every key ever added, persisted to the sidecar
+      file ``path``. It is kept as two generations: when the current one is
+      full it becomes the previous one and a fresh filter is started, so
+      memory and the false-positive rate stay bounded regardless of history.
+
+    If the state store keeps an exact history (``exact_history``, the SQLite
+    backend) Bloom hits are confirmed against it and new keys are recorded
+    there too; otherwise a Bloom hit is treated as a duplicate. Filter
+    generations built before the store had exact history (e.g. after moving
+    from JSON to SQLite) hold keys the store has never seen, so hits in them
+    are still trusted until they rotate out; their number is kept under
+    ``dedup:<namespace>:unconfirmed``.
+
+    A JSON ``sent_posts`` list left by older versions is folded into the
+    index the first time it is loaded (``legacy_key``).
+    """
+
+    def __init__(
+        self,
+        state,
+        namespace: str,
+        path: str,
+        max_recent: int = 1000,
+        max_age: float = 30 * 24 * 3600,
+        bloom_capacity: int = 100_000,
+        error_rate: float = 0.001,
+        exact_prefix: str = "",
+        legacy_key: Optional[str] = None,
+        save_delay: float = 5.0,
+    ):
+        self.state = state
+        self.namespace = namespace
+        self.path = path
+        self.max_recent = max_recent
+        self.max_age = max_age
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self.exact_prefix = exact_prefix
+        self.legacy_key = legacy_key
+        self.save_delay = save_delay
+        self.recent_key = f"dedup:{namespace}:recent"
+        self.unconfirmed_key = f"dedup:{namespace}:unconfirmed"
+        self._recent: "OrderedDict[str, float]" = OrderedDict()
+        self._blooms: List[BloomFilter] = []
+        # Oldest generations that may hold keys missing from the exact history
+        self._unconfirmed = 0
+        self._saved_unconfirmed = 0
+        self._persisted_recent = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._save_task: Optional[asyncio.Task] = None
+        self._bloom_dirty = False
+
+    @property
+    def _exact(self) -> bool:
+        return getattr(self.state, "exact_history", False)
+
+    def _new_bloom(self) -> BloomFilter:
+        return BloomFilter(self.bloom_capacity, self.error_rate)
+
+    def _read_blooms_sync(self) -> List[BloomFilter]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            blob = f.read()
+        blooms = []
+        offset = 0
+        while offset < len(blob):
+            bloom = BloomFilter.from_bytes(blob[offset:], self.bloom_capacity, self.error_rate)
+            blooms.append(bloom)
+            offset += BloomFilter.HEADER.size + len(bloom.bits)
+        return blooms
+
+    def _write_blooms_sync(self, blob: bytes):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def load(self):
+        """Read the filters and recent set; called lazily by ``contains``/``add``."""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                self._blooms = await asyncio.to_thread(self._read_blooms_sync)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to read dedup filter {self.path}, rebuilding: {e}")
+                self._blooms = []
+            rebuild = not self._blooms
+            if rebuild:
+                self._blooms = [self._new_bloom()]
+
+            for key, ts in await self.state.get(self.recent_key, []) or []:
+                self._recent[key] = ts
+            self._persisted_recent = len(self._recent)
+            # Recent keys may be newer than the last filter save
+            for key in self._recent:
+                if key not in self._blooms[0]:
+                    self._blooms[0].add(key)
+                    self._bloom_dirty = True
+
+            if self._exact:
+                await self._load_unconfirmed(rebuild)
+            if rebuild and self.legacy_key:
+                await self._import_legacy()
+            self._loaded = True
+            self._evict()
+            if self._bloom_dirty:
+                self._schedule_save()
+
+    async def _load_unconfirmed(self, rebuild: bool):
+        unconfirmed = await self.state.get(self.unconfirmed_key)
+        if unconfirmed is None:
+            # First load on a store with exact history: an existing filter was
+            # filled without it, and recent keys may be missing from it too.
+            unconfirmed = 0 if rebuild else len(self._blooms)
+            namespace = self.exact_prefix.rstrip(":")
+            async with self.state.transaction() as txn:
+                for key in self._recent:
+                    await txn.mark_sent(self.exact_prefix + key, namespace=namespace)
+                await txn.set(self.unconfirmed_key, unconfirmed)
+            if unconfirmed:
+                logger.info(
+                    f"Dedup index '{self.namespace}' predates exact history, "
+                    f"trusting {unconfirmed} filter generation(s)"
+                )
+        self._unconfirmed = self._saved_unconfirmed = unconfirmed
+
+    async def _import_legacy(self):
+        legacy = await self.state.get(self.legacy_key, []) or []
+        if not legacy:
+            return
+        now = time.time()
+        for key in legacy:
+            self._bloom_add(key)
+        for key in legacy[-self.max_recent:]:
+            self._recent[key] = now
+        await self.state.set(self.recent_key, [[k, ts] for k, ts in self._recent.items()])
+        self._persisted_recent = len(self._recent)
+        if not self._exact:
+            # The list is now covered by the index; stop carrying it around,
+            # but only once the filter holding it is safely on disk
+            await self.flush()
+            await self.state.set(self.legacy_key, [])
+        logger.info(f"Imported {len(legacy)} legacy entries into dedup index '{self.namespace}'")
+
+    def _bloom_add(self, key: str):
+        current = self._blooms[0]
+        if current.is_full:
+            # Only the previous current generation survives the rotation
+            self._unconfirmed = 1 if self._unconfirmed == len(self._blooms) else 0
+            current = self._new_bloom()
+            self._blooms = [current, self._blooms[0]]
+            logger.info(f"Dedup index '{self.namespace}' rotated its Bloom filter")
+        current.add(key)
+        self._bloom_dirty = True
+
+    def _evict(self) -> bool:
+        """Drop recent keys over the count/age limits; they stay in the filter."""
+        cutoff = time.time() - self.max_age
+        evicted = False
+        while self._recent:
+            key, ts = next(iter(self._recent.items()))
+            if len(self._recent) <= self.max_recent and ts >= cutoff:
+                break
+            self._recent.popitem(last=False)
+            evicted = True
+        return evicted
+
+    async def contains(self, key: str) -> bool:
+        await self.load()
+        if key in self._recent:
+            return True
+        hits = [i for i, bloom in enumerate(self._blooms) if key in bloom]
+        if not hits:
+            return False
+        if not self._exact or await self.state.has_sent(self.exact_prefix + key):
+            return True
+        # Not in the exact history, but it may predate it
+        return hits[-1] >= len(self._blooms) - self._unconfirmed
+
+    async def add(self, key: str, writer=None):
+        """Record ``key`` as seen.
+
+        ``writer`` is where the recent-set entry is persisted; it defaults to
+        the state store and can be anything with the same ``append``/``set``
+        (and ``mark_sent``) coroutine methods. If it is a transaction, the
+        in-memory index only learns the key once the transaction commits, so
+        a rolled back post is not treated as sent.
+        """
+        await self.load()
+        writer = writer or self.state
+        if key in self._recent:
+            return
+        now = time.time()
+        if self._exact:
+            # The prefix doubles as the sent_posts namespace ("patreon:" -> "patreon")
+            await writer.mark_sent(self.exact_prefix + key, namespace=self.exact_prefix.rstrip(":"))
+
+        # Persist the recent set as O(1) appends and only rewrite it once it
+        # has grown a quarter past its limit.
+        rewrite = self._persisted_recent >= self.max_recent * 1.25
+        if rewrite:
+            recent = [[k, ts] for k, ts in self._recent.items()]
+            recent = recent[max(0, len(recent) - self.max_recent + 1):] + [[key, now]]
+            await writer.set(self.recent_key, recent)
+        else:
+            await writer.append(self.recent_key, [key, now])
+
+        def remember():
+            self._recent[key] = now
+            self._bloom_add(key)
+            self._evict()
+            self._persisted_recent = len(self._recent) if rewrite else self._persisted_recent + 1
+            self._schedule_save()
+
+        on_commit = getattr(writer, "on_commit", None)
+        if on_commit is not None:
+            on_commit(remember)
+        else:
+            remember()
+
+    def _schedule_save(self):
+        if self._save_handle is None and (self._save_task is None or self._save_task.done()):
+            loop = asyncio.get_running_loop()
+            self._save_handle = loop.call_later(self.save_delay, self._start_save)
+
+    def _start_save(self):
+        self._save_handle = None
+        self._save_task = asyncio.ensure_future(self._background_save())
+
+    async def _background_save(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to save dedup filter {self.path}: {e}", exc_info=True)
+        if self._bloom_dirty and self._save_handle is None:
+            self._schedule_save()
+
+    async def flush(self):
+        """Write the Bloom filters to disk if they changed."""
+        if not self._bloom_dirty:
+            return
+        self._bloom_dirty = False
+        blob = b"".join(bloom.to_bytes() for bloom in self._blooms)
+        try:
+            await asyncio.to_thread(self._write_blooms_sync, blob)
+        except Exception:
+            self._bloom_dirty = True
+            raise
+        if self._exact and self._unconfirmed != self._saved_unconfirmed:
+            # Saved after the filter so a crash in between only over-trusts
+            await self.state.set(self.unconfirmed_key, self._unconfirmed)
+            self._saved_unconfirmed = self._unconfirmed
+
+    async def close(self):
+        if self._save_task is not None and not self._save_task.done():
+            await self._save_task
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "recent": len(self._recent),
+            "total": sum(bloom.count for bloom in self._blooms),
+            "filters": len(self._blooms),
+            "filter_bytes": sum(len(bloom.bits) for bloom in self._blooms),
+        }
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import discord
+from bot.channel_index import ChannelIndex
 from bot.config import cfg
 
 
@@ -8,17 +9,29 @@ logger = logging.getLogger(__name__)
 
 
 class DiscordAdmin:
-    def __init__(self, bot, state, service_manager):
+    def __init__(self, bot, state, service_manager, dedup=None, channels=None, dispatcher=None,
+                 attachments=None, image_executor=None):
         """Initialize Discord admin interface.
         
         Args:
             bot: discord.Client instance
             state: StateStore instance
             service_manager: ServiceManager instance
+            dedup: DedupIndex for DeviantArt posts (optional)
+            channels: ChannelIndex shared with DiscordPoster (optional)
+            dispatcher: SendDispatcher of DiscordPoster, for status (optional)
+            attachments: AttachmentCache of DiscordPoster, for status (optional)
+            image_executor: ImageExecutor, for status (optional)
         """
         self.bot = bot
         self.state = state
         self.service_manager = service_manager
+        self.dedup = dedup
+        self._owns_channels = channels is None
+        self.channels = channels or ChannelIndex(bot)
+        self.dispatcher = dispatcher
+        self.attachments = attachments
+        self.image_executor = image_executor
         self.commands_channel = None
         self.logs_channel = None
         self._authorized_users = set()
@@ -48,23 +61,26 @@ class DiscordAdmin:
     async def initialize(self):
         """Initialize command and log channel references."""
         # Find channels by name
-        for guild in self.bot.guilds:
-            for channel in guild.text_channels:
-                if channel.name == cfg.discord_commands_channel_name:
-                    self.commands_channel = channel
-                    logger.info(f"✅ Commands channel found: #{channel.name} in {guild.name}")
-                
-                if channel.name == cfg.discord_admin_channel_name:
-                    self.logs_channel = channel
-                    logger.info(f"✅ Logs channel found: #{channel.name} in {guild.name}")
-                    
-                    # Send startup notification
-                    await self._send_startup_message()
-        
-        if self.commands_channel is None:
+        if self._owns_channels:
+            self.channels.rebuild()
+        self.commands_channel = self.channels.get(cfg.discord_commands_channel_name)
+        self.logs_channel = self.channels.get(cfg.discord_admin_channel_name)
+
+        if self.commands_channel:
+            logger.info(f"✅ Commands channel found: #{self.commands_channel.name} in {self.commands_channel.guild.name}")
+        else:
             logger.error(f"❌ Commands channel not found: {cfg.discord_commands_channel_name}")
-        if self.logs_channel is None:
+        if self.logs_channel:
+            logger.info(f"✅ Logs channel found: #{self.logs_channel.name} in {self.logs_channel.guild.name}")
+            # Send startup notification
+            await self._send_startup_message()
+        else:
             logger.error(f"❌ Logs channel not found: {cfg.discord_admin_channel_name}")
+
+    def refresh_channels(self):
+        """Re-resolve command and log channels from the channel index."""
+        self.commands_channel = self.channels.get(cfg.discord_commands_channel_name)
+        self.logs_channel = self.channels.get(cfg.discord_admin_channel_name)
     
     async def _send_startup_message(self):
         """Send startup notification with available commands."""
@@ -185,7 +201,12 @@ class DiscordAdmin:
             return
         
         analytics = await self.state.get("analytics:posts_sent", 0)
-        posts_count = len(await self.state.get("sent_posts", []))
+        if self.dedup:
+            await self.dedup.load()
+            dedup_stats = self.dedup.stats()
+            posts_count = f"{dedup_stats['total']} ({dedup_stats['recent']} recent)"
+        else:
+            posts_count = await self.state.sent_count()
         embed_style = await self.state.get("embed_style", "full")
         poll_interval = await self.state.get("poll_interval_seconds", cfg.poll_interval_seconds)
         
@@ -204,6 +225,62 @@ class DiscordAdmin:
             status_text += f"{service_name}: {status}\n"
         status_text += "```"
         embed.add_field(name="Services", value=status_text, inline=False)
+
+        limiter = next(
+            (svc.rate_limiter for svc in self.service_manager.services.values()
+             if hasattr(svc, "rate_limiter")),
+            None,
+        )
+        if limiter:
+            rl = limiter.stats()
+            embed.add_field(
+                name="DeviantArt API",
+                value=f"Tokens: **{rl['tokens']}**/{rl['burst']} ({rl['rate']}/s)\n"
+                      f"Requests: {rl['requests']}, throttled: {rl['throttled']} "
+                      f"(avg wait {rl['avg_wait']}s), 429s: {rl['rate_limited']}"
+                      + (f"\n⏸ {rl['paused']} paused, up to {rl['paused_for']}s" if rl['paused'] else ""),
+                inline=False,
+            )
+
+        if self.dispatcher:
+            ds = self.dispatcher.stats()
+            embed.add_field(
+                name="Discord Delivery",
+                value=f"Queued: **{ds['queued']}** (max {ds['max_queue']} in one of {ds['channels']} channels)\n"
+                      f"Sent: {ds['sent']}, failed: {ds['failed']}, retries: {ds['retried']}, "
+                      f"uploaded {ds['uploaded_bytes'] / 1024 / 1024:.1f} MB\n"
+                      f"Latency: avg {ds['avg_latency']}s, p95 {ds['p95_latency']}s",
+                inline=False,
+            )
+        if self.attachments and cfg.discord_staging_channel_name:
+            st = self.attachments.stats()
+            embed.add_field(
+                name="Staged Attachments",
+                value=f"Uploads: {st['uploads']} ({st['uploaded_bytes'] / 1024 / 1024:.1f} MB), "
+                      f"reused: {st['hits']}, re-signed: {st['refreshed']}, cached: {st['entries']}",
+                inline=False,
+            )
+
+        if self.image_executor:
+            ix = self.image_executor.stats()
+            embed.add_field(
+                name="Image Workers",
+                value=f"{ix['workers']} {ix['mode']} workers, pending: **{ix['pending']}**\n"
+                      f"Jobs: {ix['jobs']} (failed {ix['failed']}), "
+                      f"avg {ix['avg_ms']} ms, max {ix['max_ms']} ms, queue wait {ix['avg_wait_ms']} ms",
+                inline=False,
+            )
+
+        cadence_lines = [
+            f"{svc.username}: {svc.describe_cadence()}"
+            for svc in self.service_manager.services.values()
+            if hasattr(svc, "describe_cadence")
+        ]
+        if cadence_lines:
+            cadence_text = "```\n" + "\n".join(cadence_lines) + "\n```"
+            if len(cadence_text) > 1024:
+                cadence_text = cadence_text[:1017] + "...\n```"
+            embed.add_field(name="Poll Cadence", value=cadence_text, inline=False)
         
         await message.reply(embed=embed)
     
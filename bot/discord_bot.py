@@ -1,16 +1,173 @@
 import asyncio
 import logging
+import random
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+import aiohttp
 import discord
+from bot.attachments import AttachmentCache, fit_files, pack_batches, upload_limit
+from bot.channel_index import ChannelIndex
 from bot.config import cfg
 from bot.discord_admin import DiscordAdmin
 from bot.discord_logger import DiscordLogHandler
+from bot.webhook import WebhookDirectory, WebhookError, WebhookSender
+from services.http_client import HttpClient
+from services.scheduler import PollScheduler
 
 
 logger = logging.getLogger(__name__)
 
 
+class SendDispatcher:
+    """Outbound queue for Discord messages with one worker per channel.
+
+    ``submit()`` enqueues a ``channel.send`` and returns a future for the sent
+    message. Each channel has its own FIFO worker, so messages to a channel
+    keep their order while different channels are delivered in parallel.
+    discord.py already serialises requests per rate-limit bucket and sleeps
+    through short 429s; long 429s (``discord.RateLimited``), 5xx responses and
+    network errors are retried here with exponential backoff. ``make_kwargs``
+    is called for every attempt because a ``discord.File`` can only be sent
+    once. Idle workers exit after ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0,
+                 idle_timeout: float = 300.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idle_timeout = idle_timeout
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._latencies = deque(maxlen=200)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.uploaded_bytes = 0
+
+    def submit(self, channel, make_kwargs: Callable[[], dict], label: str = "", size: int = 0) -> asyncio.Future:
+        """Queue ``channel.send(**make_kwargs())``; the future resolves to the message.
+
+        ``size`` is the number of attachment bytes, counted once delivered.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = asyncio.Queue()
+        queue.put_nowait((channel, make_kwargs, label, size, time.monotonic(), future))
+        worker = self._workers.get(channel.id)
+        if worker is None or worker.done():
+            self._workers[channel.id] = asyncio.create_task(self._worker(channel.id, queue))
+        return future
+
+    async def send(self, channel, make_kwargs: Callable[[], dict], label: str = "", size: int = 0):
+        """Queue a send and wait until it was delivered.
+
+        For callers that need the message right away; producers should use
+        ``submit`` and react to the future instead of waiting.
+        """
+        return await self.submit(channel, make_kwargs, label, size)
+
+    async def _worker(self, channel_id: int, queue: asyncio.Queue):
+        while True:
+            try:
+                job = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                if not queue.empty():
+                    # A job arrived while the wait was being cancelled
+                    continue
+                self._workers.pop(channel_id, None)
+                self._queues.pop(channel_id, None)
+                return
+
+            channel, make_kwargs, label, size, queued_at, future = job
+            try:
+                if future.cancelled():
+                    continue
+                message = await self._deliver(channel, make_kwargs, label)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.sent += 1
+                self.uploaded_bytes += size
+                self._latencies.append(time.monotonic() - queued_at)
+                if not future.done():
+                    future.set_result(message)
+            finally:
+                queue.task_done()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.base_delay * 2 ** attempt, self.max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _deliver(self, channel, make_kwargs: Callable[[], dict], label: str):
+        attempt = 0
+        while True:
+            try:
+                return await channel.send(**make_kwargs())
+            except discord.RateLimited as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = e.retry_after
+                reason = "rate limited"
+            except (discord.HTTPException, WebhookError) as e:
+                if (e.status < 500 and e.status != 429) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                reason = f"HTTP {e.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                reason = type(e).__name__
+
+            attempt += 1
+            self.retried += 1
+            logger.warning(
+                f"Discord send to #{channel.name} failed ({reason}){' for ' + label if label else ''}, "
+                f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        depths = {cid: q.qsize() for cid, q in self._queues.items()}
+        return {
+            "queued": sum(depths.values()),
+            "max_queue": max(depths.values(), default=0),
+            "channels": len(self._workers),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "uploaded_bytes": self.uploaded_bytes,
+            "avg_latency": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p95_latency": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2)
+            if latencies else 0.0,
+        }
+
+    async def close(self):
+        """Stop all workers; queued sends are cancelled."""
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for queue in self._queues.values():
+            while not queue.empty():
+                future = queue.get_nowait()[-1]
+                future.cancel()
+        self._workers.clear()
+        self._queues.clear()
+
+
 class DiscordPoster:
-    def __init__(self, services, state, service_manager, telegram_service=None):
+    def __init__(self, services, state, service_manager, telegram_service=None, dedup=None, http=None,
+                 image_executor=None):
         intents = discord.Intents.default()
         intents.message_content = True
         self.bot = discord.Client(intents=intents)
@@ -18,17 +175,51 @@ class DiscordPoster:
         self.telegram_service = telegram_service
         self.state = state
         self.service_manager = service_manager
+        self.dedup = dedup
+        self.scheduler = PollScheduler(
+            service_manager,
+            max_concurrency=cfg.poll_max_concurrency,
+            jitter=cfg.poll_jitter,
+        )
+        self.dispatcher = SendDispatcher(max_retries=cfg.discord_send_retries)
+        self.image_executor = image_executor
+        self.attachments = AttachmentCache(
+            self.dispatcher, ttl=cfg.discord_attachment_cache_ttl, executor=image_executor
+        )
         self._bot_ready = asyncio.Event()
         self.admin = None
         self.posts_channel = None
+        self.channels = ChannelIndex(self.bot)
+        # DeviantArt URL -> delivery still in the send queue
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Webhook delivery does not depend on the gateway connection
+        self.webhooks = None
+        # HttpClient created here (no shared one given), closed in close()
+        self._own_http = None
+        if cfg.discord_delivery_mode == "webhook":
+            if http is None:
+                http = self._own_http = HttpClient()
+            self.webhooks = WebhookDirectory(
+                WebhookSender(http),
+                state,
+                configured=WebhookDirectory.parse(cfg.discord_webhooks),
+            )
+        elif cfg.discord_delivery_mode != "gateway":
+            logger.warning(f"Unknown DISCORD_DELIVERY_MODE {cfg.discord_delivery_mode!r}, using gateway")
 
 
         @self.bot.event
         async def on_ready():
             logger.info(f"✅ Discord client ready as {self.bot.user}")
+            # Rebuilt on every (re)connect, kept fresh by the events below
+            self.channels.rebuild()
             # Initialize admin and posts channel on first ready
             if self.admin is None:
-                self.admin = DiscordAdmin(self.bot, self.state, self.service_manager)
+                self.admin = DiscordAdmin(
+                    self.bot, self.state, self.service_manager, dedup=self.dedup,
+                    channels=self.channels, dispatcher=self.dispatcher, attachments=self.attachments,
+                    image_executor=self.image_executor,
+                )
                 await self.admin.initialize()
                 
                 # Attach Discord logger handler after admin is ready
@@ -47,17 +238,52 @@ class DiscordPoster:
             
             self._bot_ready.set()
         
+        @self.bot.event
+        async def on_guild_channel_create(channel):
+            self.channels.add(channel)
+            self._refresh_channels()
+
+        @self.bot.event
+        async def on_guild_channel_delete(channel):
+            self.channels.remove(channel)
+            self._refresh_channels()
+
+        @self.bot.event
+        async def on_guild_channel_update(before, after):
+            self.channels.update(before, after)
+            self._refresh_channels()
+
+        @self.bot.event
+        async def on_guild_join(guild):
+            self.channels.add_guild(guild)
+            self._refresh_channels()
+
+        @self.bot.event
+        async def on_guild_remove(guild):
+            self.channels.remove_guild(guild)
+            self._refresh_channels()
+
         @self.bot.event
         async def on_error(event, *args, **kwargs):
             logger.error(f"Discord event error in {event}: {args}, {kwargs}", exc_info=True)
 
     async def _get_channel_by_name(self, name: str):
-        """Find a channel by name across all guilds."""
-        for guild in self.bot.guilds:
-            for channel in guild.text_channels:
-                if channel.name == name:
-                    return channel
-        return None
+        """Find a text channel by name across all guilds."""
+        return self.channels.get(name)
+
+    def _refresh_channels(self):
+        """Re-resolve configured channels after the index changed."""
+        if not self._bot_ready.is_set():
+            return
+        channel = self.channels.get(cfg.discord_posts_channel_name)
+        if channel is not self.posts_channel:
+            self.posts_channel = channel
+            if channel:
+                logger.info(f"✅ Posts channel is now #{channel.name} in {channel.guild.name}")
+            else:
+                logger.error(f"❌ Posts channel not found: {cfg.discord_posts_channel_name}")
+        if self.admin is not None:
+            self.admin.refresh_channels()
 
     async def _initialize_posts_channel(self):
         """Find posts channel by name across all guilds."""
@@ -67,26 +293,81 @@ class DiscordPoster:
         else:
             logger.error(f"❌ Posts channel not found: {cfg.discord_posts_channel_name}")
 
-    async def on_telegram_post(self, payload: dict):
-        """Callback for Telegram service to post to Discord."""
-        await self._bot_ready.wait()
-        
+    async def _resolve_channel(self, name: str, wait: bool = True):
+        """Target for channel ``name``: its webhook in webhook mode, else the channel.
+
+        Known webhooks are returned without waiting for the gateway; otherwise
+        the channel is looked up once the bot is ready (unless ``wait`` is
+        False) and, in webhook mode, a webhook is created for it.
+        """
+        if not name:
+            return None
+        if self.webhooks is not None:
+            target = await self.webhooks.channel_for(name)
+            if target is not None:
+                return target
+        if wait:
+            await self._bot_ready.wait()
+        channel = self.channels.get(name)
+        if channel is not None and self.webhooks is not None:
+            return await self.webhooks.channel_for(name, channel) or channel
+        return channel
+
+    async def _staged_urls(self, files):
+        """CDN URLs of ``files`` uploaded once to the staging channel, or None.
+
+        None means attachment reuse is off (no staging channel configured or
+        found) or staging failed, and the caller should upload the files.
+        """
+        if not cfg.discord_staging_channel_name or not files:
+            return None
+        staging = await self._resolve_channel(cfg.discord_staging_channel_name, wait=False)
+        if staging is None:
+            logger.warning(f"Staging channel not found: {cfg.discord_staging_channel_name}, uploading directly")
+            return None
+        try:
+            return await self.attachments.urls_for(staging, files)
+        except Exception as e:
+            logger.error(f"Failed to stage attachments, uploading directly: {e}")
+            return None
+
+    @staticmethod
+    def _when_sent(sends, on_sent) -> asyncio.Future:
+        """Future resolving to True once every queued send is delivered.
+
+        ``on_sent()`` (bookkeeping) is awaited first; if a send fails the
+        future raises its error and ``on_sent`` is not called.
+        """
+        async def settle():
+            results = await asyncio.gather(*sends, return_exceptions=True)
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                raise errors[0]
+            await on_sent()
+            return True
+        return asyncio.ensure_future(settle())
+
+    async def on_telegram_post(self, payload: dict) -> Optional[asyncio.Future]:
+        """Callback for Telegram service to post to Discord.
+
+        Queues the messages and returns without waiting for them: the result
+        is a future that resolves once they were delivered (see
+        ``_when_sent``), or None if nothing could be queued.
+        """
         try:
             target_channel_name = payload.get("target_channel_name")
             
             # Find target channel
-            channel = None
-            if target_channel_name:
-                channel = await self._get_channel_by_name(target_channel_name)
+            channel = await self._resolve_channel(target_channel_name)
             
             if not channel:
-                channel = self.posts_channel
+                channel = await self._resolve_channel(cfg.discord_posts_channel_name)
                 if channel:
                     logger.warning(f"Target channel {target_channel_name} not found, using default {channel.name}")
             
             if not channel:
                 logger.error("No channel available to post message")
-                return
+                return None
 
             source = payload.get("source")
             title = payload.get("title", "New Post")
@@ -98,12 +379,6 @@ class DiscordPoster:
                 files_data = payload.get("files", []) # List of (filename, bytes)
                 description = payload.get("description", "")
                 
-                # Create Discord Files
-                discord_files = []
-                import io
-                for fname, fbytes in files_data:
-                    discord_files.append(discord.File(io.BytesIO(fbytes), filename=fname))
-                
                 # Generate Random Bright Color
                 import random
                 import colorsys
@@ -121,14 +396,40 @@ class DiscordPoster:
                     color=bright_color
                 )
 
-                # Send message with embed (Text)
-                await channel.send(embed=embed)
-                
-                # Send files (Images) in batches
-                for i in range(0, len(discord_files), 10):
-                    await channel.send(files=discord_files[i:i+10])
+                # Images already staged are referenced by URL instead of re-uploaded
+                image_urls = await self._staged_urls(files_data)
 
-                logger.info(f"📤 Sent Collection to Discord #{channel.name}")
+                # Send message with embed (Text), then files (Images) in batches.
+                # Queued back to back so the channel worker keeps them together.
+                import io
+                sends = [self.dispatcher.submit(channel, lambda: {"embed": embed}, label=title)]
+                if image_urls:
+                    for i in range(0, len(image_urls), 10):
+                        image_embeds = [
+                            discord.Embed(color=bright_color).set_image(url=u) for u in image_urls[i:i+10]
+                        ]
+                        sends.append(self.dispatcher.submit(
+                            channel, lambda e=image_embeds: {"embeds": e}, label=title
+                        ))
+                else:
+                    # Pack by count and by bytes so no message exceeds the upload limit
+                    limit = upload_limit(channel)
+                    batches = pack_batches(await fit_files(files_data, limit, self.image_executor), limit)
+                    for n, batch in enumerate(batches, 1):
+                        size = sum(len(fbytes) for _, fbytes in batch)
+                        logger.info(
+                            f"📦 Batch {n}/{len(batches)} to #{channel.name}: "
+                            f"{len(batch)} files, {size / 1024:.0f} KB"
+                        )
+                        sends.append(self.dispatcher.submit(
+                            channel,
+                            lambda batch=batch: {
+                                "files": [discord.File(io.BytesIO(fbytes), filename=fname) for fname, fbytes in batch]
+                            },
+                            label=title,
+                            size=size,
+                        ))
+                kind = "Collection"
                 
             else:
                 # Announcement Flow (Single Image Embed)
@@ -142,20 +443,37 @@ class DiscordPoster:
                     color=0xFF424D # Patreon Brand Color
                 )
                 
-                file = None
-                if image_bytes:
-                    import io
-                    file = discord.File(io.BytesIO(image_bytes), filename=filename)
+                staged = await self._staged_urls([(filename, image_bytes)] if image_bytes else [])
+                if staged:
+                    embed.set_image(url=staged[0])
+                elif image_bytes:
+                    (filename, image_bytes), = await fit_files(
+                        [(filename, image_bytes)], upload_limit(channel), self.image_executor
+                    )
                     embed.set_image(url=f"attachment://{filename}")
-                
-                await channel.send(embed=embed, file=file)
-                logger.info(f"📤 Sent Announcement to Discord #{channel.name}")
-            
-            # increment analytics
-            await self.state.update("analytics:posts_sent", lambda v: (v or 0) + 1)
+
+                def make_announcement():
+                    file = None
+                    if image_bytes and not staged:
+                        import io
+                        file = discord.File(io.BytesIO(image_bytes), filename=filename)
+                    return {"embed": embed, "file": file}
+
+                sends = [self.dispatcher.submit(
+                    channel, make_announcement, label=title, size=0 if staged else len(image_bytes or b"")
+                )]
+                kind = "Announcement"
+
+            async def on_sent():
+                logger.info(f"📤 Sent {kind} to Discord #{channel.name}")
+                # increment analytics
+                await self.state.update("analytics:posts_sent", lambda v: (v or 0) + 1)
+
+            return self._when_sent(sends, on_sent)
             
         except Exception as e:
             logger.error(f"💥 Error processing Telegram post: {e}", exc_info=True)
+            return None
 
     async def start(self):
         """Start Discord bot and services concurrently."""
@@ -194,10 +512,8 @@ class DiscordPoster:
             
             logger.info("Discord bot connected, starting services")
             
-            # Start service polling tasks
-            service_tasks = [
-                asyncio.create_task(self._run_service(s)) for s in self.services
-            ]
+            # One scheduler drives polling for every registered service
+            service_tasks = [asyncio.create_task(self.scheduler.run(self._poll_service))]
             
             if self.telegram_service:
                 service_tasks.append(asyncio.create_task(self.telegram_service.start()))
@@ -214,8 +530,15 @@ class DiscordPoster:
             raise
 
 
-    async def _run_service(self, service):
-        """Run a single service with polling."""
+    async def close(self):
+        """Stop the send queue and close the HTTP client this poster created."""
+        await self.dispatcher.close()
+        if self._own_http is not None:
+            await self._own_http.close()
+            self._own_http = None
+
+    async def _poll_service(self, service):
+        """Run one scheduled poll of a service."""
         async def getter(k):
             return await self.state.get(k, None)
 
@@ -225,38 +548,48 @@ class DiscordPoster:
         # Use standard handler for all services
         await self._run_standard_service(service, getter, setter)
 
+    async def _record_sent(self, url: str, txn):
+        """Record a delivered DeviantArt post and count it, in one transaction."""
+        if self.dedup:
+            await self.dedup.add(url, writer=txn)
+        else:
+            await txn.mark_sent(url)
+        await txn.update("analytics:posts_sent", lambda v: (v or 0) + 1)
+
+    async def _is_sent(self, url: str) -> bool:
+        if self.dedup:
+            return await self.dedup.contains(url)
+        return await self.state.has_sent(url)
+
     async def _run_standard_service(self, service, getter, setter):
-        """Run a standard service (DeviantArt, etc) with polling."""
+        """Run one poll of a standard service (DeviantArt, etc)."""
         async def on_new(service_obj, deviation):
-            # Extract data from DeviantArt API deviation object
+            # Deviation record projected from the DeviantArt API object.
+            # The message is only queued: the returned future resolves once
+            # it was delivered and recorded, and the service commits its
+            # watermark after that. Each post is recorded in its own
+            # transaction as soon as it was delivered, so it is not sent
+            # again even if the rest of its batch fails. Failing to queue
+            # raises, so the service retries the batch on the next poll.
             try:
-                title = deviation.get("title", "No title")
-                url = deviation.get("url", "#")
-                thumbs = deviation.get("thumbs", [])
+                title = deviation.title
+                url = deviation.url
+                thumb_url = deviation.thumb_url
+
+                # Still queued from an earlier poll
+                pending = self._in_flight.get(url)
+                if pending is not None:
+                    return pending
                 
                 # Check if post already sent
-                sent_posts = await self.state.get("sent_posts", [])
-                if url in sent_posts:
+                if await self._is_sent(url):
                     logger.info(f"⏭️ Skipping duplicate post: {title} ({url})")
-                    return
-                
-                # thumbs is a list of dicts with 'src', 'height', 'width'
-                thumb_url = None
-                if thumbs:
-                    thumb_obj = thumbs[0]
-                    if isinstance(thumb_obj, dict):
-                        thumb_url = thumb_obj.get("src")
-                    else:
-                        thumb_url = str(thumb_obj)
+                    return None
                 
-                # Wait for bot to be ready
-                await self._bot_ready.wait()
-                
-                # send message to channel
-                channel = self.posts_channel
+                # send message to channel (waits for the bot unless a webhook is known)
+                channel = await self._resolve_channel(cfg.discord_posts_channel_name)
                 if channel is None:
-                    logger.error(f"Posts channel not available: {cfg.discord_posts_channel_name}")
-                    return
+                    raise RuntimeError(f"Posts channel not available: {cfg.discord_posts_channel_name}")
                 
                 # Get embed style
                 embed_style = await self.state.get("embed_style", "full")
@@ -264,7 +597,7 @@ class DiscordPoster:
                 # Build message based on style
                 if embed_style == "text":
                     # Simple text message
-                    await channel.send(f"**{title}**\n{url}")
+                    make_kwargs = lambda: {"content": f"**{title}**\n{url}"}
                 elif embed_style == "compact":
                     # Minimal embed
                     embed = discord.Embed(
@@ -274,7 +607,7 @@ class DiscordPoster:
                     )
                     if thumb_url:
                         embed.set_image(url=thumb_url)
-                    await channel.send(embed=embed)
+                    make_kwargs = lambda: {"embed": embed}
                 else:  # "full" style (default)
                     # Full embed with description
                     embed = discord.Embed(
@@ -285,16 +618,20 @@ class DiscordPoster:
                     )
                     if thumb_url:
                         embed.set_image(url=thumb_url)
-                    await channel.send(embed=embed)
-                logger.info(f"📤 Posted to Discord: {title} by {service_obj.username}")
-                
-                # Add to sent posts
-                sent_posts.append(url)
-                await self.state.set("sent_posts", sent_posts)
-                
-                # increment analytics
-                await self.state.update("analytics:posts_sent", lambda v: (v or 0) + 1)
+                    make_kwargs = lambda: {"embed": embed}
             except Exception as e:
                 logger.error(f"💥 Error posting to Discord: {e}", exc_info=True)
+                raise
+
+            async def on_sent():
+                logger.info(f"📤 Posted to Discord: {title} by {service_obj.username}")
+                # Add to sent posts and increment analytics
+                async with self.state.transaction() as txn:
+                    await self._record_sent(url, txn)
+
+            delivered = self._when_sent([self.dispatcher.submit(channel, make_kwargs, label=title)], on_sent)
+            self._in_flight[url] = delivered
+            delivered.add_done_callback(lambda _: self._in_flight.pop(url, None))
+            return delivered
 
-        await service.start(getter, setter, on_new)
+        await service.poll_step(getter, setter, on_new, state_transaction=self.state.transaction)
@@ -1,14 +1,101 @@
 import json
 import asyncio
-from typing import Any, Dict
+import contextlib
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Set
 import aiofiles
 import os
 
 
+logger = logging.getLogger(__name__)
+
+
+class StateTransaction:
+    """Mutations collected inside ``StateStore.transaction()``.
+
+    Writes are only buffered here and applied together when the block exits;
+    ``get`` reads the committed state and does not see buffered writes.
+    Callbacks registered with ``on_commit`` run once the writes are stored
+    and are dropped if the transaction is rolled back.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.mutations = []
+        self._on_commit = []
+
+    def on_commit(self, callback):
+        """Call ``callback()`` after the transaction has been committed."""
+        self._on_commit.append(callback)
+
+    def _committed(self):
+        for callback in self._on_commit:
+            callback()
+
+    async def get(self, key: str, default=None):
+        return await self.store.get(key, default)
+
+    async def set(self, key: str, value):
+        self.mutations.append(("set", key, value))
+
+    async def update(self, key: str, updater):
+        self.mutations.append(("update", key, updater))
+
+    async def append(self, key: str, item):
+        self.mutations.append(("append", key, item))
+
+    async def mark_sent(self, url: str, namespace: str = ""):
+        self.mutations.append(("mark_sent", namespace, url))
+
+
 class StateStore:
-    def __init__(self, path: str):
+    """JSON file backed key/value state with an in-memory write-back cache.
+
+    The document is parsed once on first access and then served from memory.
+    ``set``/``update`` mark keys dirty and schedule a flush ``flush_delay``
+    seconds later; writes arriving in that window are coalesced into the same
+    flush. Call ``close()`` on shutdown to persist anything still pending.
+
+    With ``journal=True`` every mutation is instead appended right away as a
+    small record to ``<path>.journal``, which is replayed on startup. Once the
+    journal grows past ``journal_max_bytes`` it is compacted into a fresh
+    snapshot. Snapshots are always written to a temp file and renamed into
+    place, so a crash never leaves a half-written ``state.json``. Journal
+    records are numbered and the snapshot stores the last number it
+    contains (``_journal_seq``), so records a crash left behind after a
+    compaction are not applied twice.
+
+    Values returned by ``get`` are the cached objects themselves: mutate them
+    only if you ``set`` them back afterwards.
+    """
+
+    # sent_posts is a list held in memory; not meant to grow without bound
+    exact_history = False
+    SEQ_KEY = "_journal_seq"
+
+    def __init__(
+        self,
+        path: str,
+        flush_delay: float = 1.0,
+        journal: bool = False,
+        journal_max_bytes: int = 1024 * 1024,
+    ):
         self.path = path
+        self.flush_delay = flush_delay
+        self.journal = journal
+        self.journal_path = f"{path}.journal"
+        self.journal_max_bytes = journal_max_bytes
         self._lock = asyncio.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+        self._dirty: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sent_index: Optional[Set[str]] = None
+        self._journal_file = None
+        self._journal_size = 0
+        self._seq = 0
         os.makedirs(os.path.dirname(path), exist_ok=True)
 
     async def _read(self) -> Dict[str, Any]:
@@ -21,23 +108,501 @@ class StateStore:
             return json.loads(content)
 
     async def _write(self, data: Dict[str, Any]):
-        async with aiofiles.open(self.path, "w") as f:
+        tmp_path = f"{self.path}.tmp"
+        async with aiofiles.open(tmp_path, "w") as f:
             await f.write(json.dumps(data, indent=2))
+            await f.flush()
+            await asyncio.to_thread(os.fsync, f.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def _load(self) -> Dict[str, Any]:
+        """Return the cached document, reading it from disk on first use."""
+        if self._data is None:
+            data = await self._read()
+            if self.journal:
+                clean = await asyncio.to_thread(self._replay_journal, data)
+                self._data = data
+                if not clean:
+                    # Never append after a torn record: fold what we could
+                    # replay into a snapshot and start a fresh journal.
+                    await self._compact_locked()
+            self._data = data
+        return self._data
+
+    def _replay_journal(self, data: Dict[str, Any]) -> bool:
+        """Apply journal records to ``data``; False if a torn record was found."""
+        if not os.path.exists(self.journal_path):
+            return True
+        applied = 0
+        self._seq = data.get(self.SEQ_KEY, 0)
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(
+                        f"Ignoring torn record in {self.journal_path} after {applied} records"
+                    )
+                    return False
+                if self._apply_record(data, record):
+                    applied += 1
+                self._seq = max(self._seq, record.get("s", 0) if isinstance(record, dict) else 0)
+                self._journal_size += len(line.encode("utf-8"))
+        if applied:
+            logger.info(f"Replayed {applied} journal records from {self.journal_path}")
+        return True
+
+    @classmethod
+    def _apply_record(cls, data: Dict[str, Any], record) -> bool:
+        """Apply one journal record unless the snapshot in ``data`` already has it."""
+        if isinstance(record, list):
+            # Unnumbered record written before journal sequence numbers
+            cls._apply_ops(data, record)
+            return True
+        if record["s"] <= data.get(cls.SEQ_KEY, 0):
+            return False
+        cls._apply_ops(data, record["o"])
+        return True
+
+    @staticmethod
+    def _apply_ops(data: Dict[str, Any], ops):
+        for op in ops:
+            if "a" in op:
+                data.setdefault(op["k"], []).append(op["a"])
+            else:
+                data[op["k"]] = op["v"]
+
+    def _append_journal_sync(self, line: str):
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_file.write(line)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+
+    def _truncate_journal_sync(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    async def _compact_locked(self):
+        """Write a snapshot of the cache and drop the journal it supersedes."""
+        if self.journal:
+            self._data[self.SEQ_KEY] = self._seq
+        await self._write(self._data)
+        await asyncio.to_thread(self._truncate_journal_sync)
+        self._journal_size = 0
+        self._dirty.clear()
+
+    async def _commit(self, ops):
+        """Persist mutations already applied to the cache.
+
+        ``ops`` is a list of ``{"k": key, "v": value}`` (set) or
+        ``{"k": key, "a": item}`` (append to list) records.
+        """
+        if not self.journal:
+            for op in ops:
+                self._mark_dirty(op["k"])
+            return
+        self._seq += 1
+        line = json.dumps({"s": self._seq, "o": ops}, separators=(",", ":")) + "\n"
+        await asyncio.to_thread(self._append_journal_sync, line)
+        self._journal_size += len(line.encode("utf-8"))
+        if self._journal_size > self.journal_max_bytes:
+            await self._compact_locked()
+
+    def _mark_dirty(self, key: str):
+        self._dirty.add(key)
+        if self._flush_handle is None and (self._flush_task is None or self._flush_task.done()):
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self._background_flush())
+
+    async def _background_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush state to {self.path}: {e}", exc_info=True)
+        # Keys dirtied while we were writing (or left over after a failure)
+        # need another round.
+        if self._dirty and self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_delay, self._start_flush)
+
+    async def _flush_locked(self):
+        if self._data is None or not self._dirty:
+            return
+        keys = set(self._dirty)
+        self._dirty.clear()
+        try:
+            await self._write(self._data)
+        except Exception:
+            self._dirty.update(keys)
+            raise
+
+    async def flush(self):
+        """Write pending changes to disk now."""
+        async with self._lock:
+            await self._flush_locked()
+
+    async def close(self):
+        """Cancel the pending timer and persist all dirty keys.
+
+        In journal mode the journal is folded into a final snapshot.
+        """
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._lock:
+            if self.journal:
+                if self._data is not None and self._journal_size:
+                    await self._compact_locked()
+                await asyncio.to_thread(self._close_journal_sync)
+            else:
+                await self._flush_locked()
+
+    def _close_journal_sync(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
 
     async def get(self, key: str, default=None):
+        if self._data is None:
+            async with self._lock:
+                await self._load()
+        return self._data.get(key, default)
+
+    def _mutate_locked(self, data: Dict[str, Any], kind: str, key: str, arg):
+        """Apply one mutation to the cached document; return its journal record."""
+        if kind == "mark_sent":
+            sent = self._sent(data)
+            if arg in sent:
+                return None
+            sent.add(arg)
+            data.setdefault("sent_posts", []).append(arg)
+            return {"k": "sent_posts", "a": arg}
+
+        if key == "sent_posts":
+            self._sent_index = None
+        if kind == "append":
+            data.setdefault(key, []).append(arg)
+            return {"k": key, "a": arg}
+        if kind == "update":
+            data[key] = arg(data.get(key, None))
+        else:
+            data[key] = arg
+        return {"k": key, "v": data[key]}
+
+    async def _mutate(self, mutations):
         async with self._lock:
-            data = await self._read()
-            return data.get(key, default)
+            data = await self._load()
+            records = []
+            for kind, key, arg in mutations:
+                record = self._mutate_locked(data, kind, key, arg)
+                if record:
+                    records.append(record)
+            if records:
+                await self._commit(records)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Buffer several mutations and apply them under one lock and one write.
+
+        Mutations made through the yielded ``StateTransaction`` are applied
+        when the block exits normally and dropped if it raises. In journal
+        mode they land in the journal as a single record.
+        """
+        txn = StateTransaction(self)
+        yield txn
+        if txn.mutations:
+            await self._mutate(txn.mutations)
+        txn._committed()
 
     async def set(self, key: str, value):
+        await self._mutate([("set", key, value)])
+
+    async def update(self, key: str, updater):
+        await self._mutate([("update", key, updater)])
+
+    async def append(self, key: str, item):
+        """Append ``item`` to the list stored under ``key``.
+
+        In journal mode this is recorded as a single item rather than the
+        whole list.
+        """
+        await self._mutate([("append", key, item)])
+
+    def _sent(self, data: Dict[str, Any]) -> Set[str]:
+        if self._sent_index is None:
+            self._sent_index = set(data.get("sent_posts") or [])
+        return self._sent_index
+
+    async def has_sent(self, url: str) -> bool:
+        """Check whether ``url`` is already recorded in ``sent_posts``."""
         async with self._lock:
-            data = await self._read()
-            data[key] = value
-            await self._write(data)
+            data = await self._load()
+            return url in self._sent(data)
+
+    async def mark_sent(self, url: str, namespace: str = ""):
+        """Record ``url`` in ``sent_posts``.
+
+        ``namespace`` is accepted for parity with the SQLite store; keys of
+        other namespaces already carry a ``<namespace>:`` prefix.
+        """
+        await self._mutate([("mark_sent", namespace, url)])
+
+    async def sent_count(self, namespace: str = "") -> int:
+        """Number of sent keys in ``namespace`` (``""``: DeviantArt URLs)."""
+        async with self._lock:
+            data = await self._load()
+            sent = self._sent(data)
+            if namespace:
+                return sum(1 for url in sent if url.startswith(f"{namespace}:"))
+            return sum(1 for url in sent if not self._is_namespaced(url))
+
+    @staticmethod
+    def _is_namespaced(url: str) -> bool:
+        # DeviantArt keys are plain URLs; others look like "patreon:<id>"
+        return not url.startswith(("http://", "https://")) and ":" in url
+
+
+class SQLiteStateStore:
+    """SQLite backed state store (WAL mode).
+
+    Keys live in a ``kv`` table as JSON-encoded values. ``sent_posts`` is not
+    kept as a single list but in its own table keyed by URL, so membership
+    checks and inserts do not depend on how much history has accumulated.
+    ``get``/``set`` of ``"sent_posts"`` still work for compatibility. Rows
+    carry a ``namespace`` (``""`` for DeviantArt URLs, ``"patreon"`` for the
+    Telegram dedup keys) so the sources can be counted separately.
+
+    If ``migrate_from`` points to an existing JSON state file and the
+    database has never been migrated, its contents are imported once.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS sent_posts ("
+        "url TEXT PRIMARY KEY, sent_at REAL NOT NULL, namespace TEXT NOT NULL DEFAULT '') WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS sent_posts_sent_at ON sent_posts (sent_at)",
+    )
+    MIGRATED_KEY = "_migrated_from"
+    # sent_posts is an indexed table, cheap to keep forever and query exactly
+    exact_history = True
+
+    def __init__(self, path: str, migrate_from: Optional[str] = None):
+        self.path = path
+        self.migrate_from = migrate_from
+        self._lock = asyncio.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in self.SCHEMA:
+            conn.execute(stmt)
+        self._add_namespace_column(conn)
+        self._migrate(conn)
+        return conn
+
+    @staticmethod
+    def _add_namespace_column(conn: sqlite3.Connection):
+        """Databases created before sent_posts had a namespace get one."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sent_posts)")]
+        if "namespace" in columns:
+            return
+        conn.execute("ALTER TABLE sent_posts ADD COLUMN namespace TEXT NOT NULL DEFAULT ''")
+        # Keys recorded so far as "<namespace>:<key>" (not URLs) move to their namespace
+        conn.execute(
+            "UPDATE sent_posts SET namespace = substr(url, 1, instr(url, ':') - 1) "
+            "WHERE instr(url, ':') > 0 AND url NOT LIKE 'http://%' AND url NOT LIKE 'https://%'"
+        )
+
+    def _migrate(self, conn: sqlite3.Connection):
+        if not self.migrate_from or not os.path.exists(self.migrate_from):
+            return
+        row = conn.execute("SELECT 1 FROM kv WHERE key = ?", (self.MIGRATED_KEY,)).fetchone()
+        if row:
+            return
+        with open(self.migrate_from, "r") as f:
+            content = f.read()
+        data = json.loads(content) if content else {}
+        journal_path = f"{self.migrate_from}.journal"
+        if os.path.exists(journal_path):
+            with open(journal_path, "r") as f:
+                for line in f:
+                    try:
+                        StateStore._apply_record(data, json.loads(line))
+                    except ValueError:
+                        break
+        data.pop(StateStore.SEQ_KEY, None)
+        sent_posts = data.pop("sent_posts", None) or []
+        now = time.time()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in data.items()],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO sent_posts (url, sent_at, namespace) VALUES (?, ?, ?)",
+                [
+                    (url, now + i * 1e-6, url.split(":", 1)[0] if StateStore._is_namespaced(url) else "")
+                    for i, url in enumerate(sent_posts)
+                ],
+            )
+            conn.execute(
+                "INSERT INTO kv (key, value) VALUES (?, ?)",
+                (self.MIGRATED_KEY, json.dumps(self.migrate_from)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(
+            f"Migrated {len(data)} keys and {len(sent_posts)} sent posts "
+            f"from {self.migrate_from} to {self.path}"
+        )
+
+    async def _run(self, fn, *args):
+        """Run ``fn(conn, *args)`` in a worker thread under the store lock."""
+        async with self._lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._connect)
+            return await asyncio.to_thread(fn, self._conn, *args)
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, key: str, default):
+        if key == "sent_posts":
+            rows = conn.execute("SELECT url FROM sent_posts ORDER BY sent_at").fetchall()
+            return [r[0] for r in rows]
+        row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @staticmethod
+    def _set(conn: sqlite3.Connection, key: str, value):
+        if key == "sent_posts":
+            now = time.time()
+            conn.execute("DELETE FROM sent_posts")
+            conn.executemany(
+                "INSERT OR IGNORE INTO sent_posts (url, sent_at) VALUES (?, ?)",
+                [(url, now + i * 1e-6) for i, url in enumerate(value or [])],
+            )
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    @classmethod
+    def _apply_mutations(cls, conn: sqlite3.Connection, mutations):
+        conn.execute("BEGIN")
+        try:
+            for kind, key, arg in mutations:
+                if kind == "mark_sent":
+                    conn.execute(
+                        "INSERT OR IGNORE INTO sent_posts (url, sent_at, namespace) VALUES (?, ?, ?)",
+                        (arg, time.time(), key),
+                    )
+                elif kind == "update":
+                    cls._set(conn, key, arg(cls._get(conn, key, None)))
+                elif kind == "append":
+                    cls._set(conn, key, (cls._get(conn, key, None) or []) + [arg])
+                else:
+                    cls._set(conn, key, arg)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Buffer several mutations and commit them in one SQLite transaction."""
+        txn = StateTransaction(self)
+        yield txn
+        if txn.mutations:
+            await self._run(self._apply_mutations, txn.mutations)
+        txn._committed()
+
+    async def get(self, key: str, default=None):
+        return await self._run(self._get, key, default)
+
+    async def set(self, key: str, value):
+        await self._run(self._apply_mutations, [("set", key, value)])
 
     async def update(self, key: str, updater):
+        await self._run(self._apply_mutations, [("update", key, updater)])
+
+    async def append(self, key: str, item):
+        await self._run(self._apply_mutations, [("append", key, item)])
+
+    async def has_sent(self, url: str) -> bool:
+        def query(conn, url):
+            return conn.execute("SELECT 1 FROM sent_posts WHERE url = ?", (url,)).fetchone() is not None
+        return await self._run(query, url)
+
+    async def mark_sent(self, url: str, namespace: str = ""):
+        await self._run(self._apply_mutations, [("mark_sent", namespace, url)])
+
+    async def sent_count(self, namespace: str = "") -> int:
+        """Number of sent keys in ``namespace`` (``""``: DeviantArt URLs)."""
+        def count(conn):
+            return conn.execute(
+                "SELECT COUNT(*) FROM sent_posts WHERE namespace = ?", (namespace,)
+            ).fetchone()[0]
+        return await self._run(count)
+
+    async def flush(self):
+        """Writes are committed immediately; nothing to do."""
+
+    async def close(self):
         async with self._lock:
-            data = await self._read()
-            cur = data.get(key, None)
-            data[key] = updater(cur)
-            await self._write(data)
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def create_state_store(
+    path: str,
+    backend: str = "",
+    flush_delay: float = 1.0,
+    journal: bool = False,
+    journal_max_bytes: int = 1024 * 1024,
+):
+    """Build the state store selected by ``backend`` or the file extension.
+
+    ``backend`` is ``"json"`` or ``"sqlite"``; when empty, a ``STATE_FILE``
+    ending in .db/.sqlite/.sqlite3 selects SQLite. For SQLite a sibling
+    ``.json`` file with the same name (e.g. ``data/state.json`` next to
+    ``data/state.db``) is migrated on first start. ``journal`` options only
+    apply to the JSON backend.
+    """
+    root, ext = os.path.splitext(path)
+    backend = (backend or "").lower()
+    if not backend:
+        backend = "sqlite" if ext.lower() in SQLITE_EXTENSIONS else "json"
+
+    if backend == "sqlite":
+        if ext.lower() not in SQLITE_EXTENSIONS:
+            path = root + ".db"
+        return SQLiteStateStore(path, migrate_from=root + ".json")
+    if backend == "json":
+        return StateStore(
+            path,
+            flush_delay=flush_delay,
+            journal=journal,
+            journal_max_bytes=journal_max_bytes,
+        )
+    raise ValueError(f"Unknown state backend: {backend}")
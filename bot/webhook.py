@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+import discord
+
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_NAME = "PixLive"
+_WEBHOOK_URL_RE = re.compile(r"/webhooks/(\d+)/([\w-]+)")
+
+
+class WebhookError(Exception):
+    """Non-success response from a Discord webhook."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(f"{message}: {status}")
+        self.status = status
+
+
+class WebhookSender:
+    """Executes Discord webhooks over the shared pooled HTTP session.
+
+    Webhooks are independent of the gateway connection and each has its own
+    rate-limit bucket. The bucket headers of every response are remembered
+    per webhook and the next request waits when the bucket is empty; a 429 is
+    slept through and retried up to ``max_retries`` times.
+
+    Requests carrying files use their own ``upload_timeout`` instead of the
+    shared session's total timeout, which is sized for API calls and would
+    cut off large uploads on a slow link.
+    """
+
+    def __init__(self, http, max_retries: int = 3, upload_timeout: float = 300):
+        self.http = http
+        self.max_retries = max_retries
+        self.upload_timeout = upload_timeout
+        self._buckets: Dict[str, Tuple[int, float]] = {}  # url -> (remaining, reset at)
+        self.requests = 0
+        self.rate_limited = 0
+
+    async def _wait_for_bucket(self, url: str):
+        remaining, reset_at = self._buckets.get(url, (1, 0.0))
+        delay = reset_at - time.monotonic()
+        if remaining <= 0 and delay > 0:
+            await asyncio.sleep(delay)
+
+    def _update_bucket(self, url: str, headers):
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_after = float(headers["X-RateLimit-Reset-After"])
+        except (KeyError, ValueError):
+            return
+        self._buckets[url] = (remaining, time.monotonic() + reset_after)
+
+    @staticmethod
+    def _form(payload: dict, files: List[Tuple[str, bytes]]) -> aiohttp.FormData:
+        form = aiohttp.FormData()
+        form.add_field("payload_json", json.dumps(payload), content_type="application/json")
+        for i, (filename, data) in enumerate(files):
+            form.add_field(f"files[{i}]", data, filename=filename, content_type="application/octet-stream")
+        return form
+
+    async def execute(
+        self,
+        url: str,
+        content: Optional[str] = None,
+        embeds: Optional[List[dict]] = None,
+        files: Optional[List[Tuple[str, bytes]]] = None,
+    ) -> dict:
+        """Post a message through the webhook at ``url`` and return the created message."""
+        payload = {"content": content or "", "embeds": embeds or []}
+        files = files or []
+        if files:
+            payload["attachments"] = [{"id": i, "filename": name} for i, (name, _) in enumerate(files)]
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_bucket(url)
+            self.requests += 1
+            # FormData can only be consumed once, so it is rebuilt per attempt
+            body = self._form(payload, files) if files else None
+            extra = {"timeout": aiohttp.ClientTimeout(total=self.upload_timeout)} if files else {}
+            async with self.http.session.post(
+                url, params={"wait": "true"}, data=body, json=None if files else payload, **extra
+            ) as resp:
+                self._update_bucket(url, resp.headers)
+                if resp.status == 429:
+                    self.rate_limited += 1
+                    try:
+                        retry_after = float((await resp.json()).get("retry_after", 1))
+                    except (aiohttp.ContentTypeError, ValueError):
+                        retry_after = float(resp.headers.get("Retry-After", 1))
+                    if attempt >= self.max_retries:
+                        raise WebhookError("Webhook rate limited", 429)
+                    logger.warning(f"Webhook rate limited, retrying in {retry_after:.1f}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                if resp.status >= 300:
+                    raise WebhookError(f"Webhook request failed ({await resp.text()})", resp.status)
+                return await resp.json()
+
+
+class WebhookChannel:
+    """Channel-like target whose ``send`` goes through a webhook.
+
+    Accepts the same keyword arguments DiscordPoster passes to
+    ``TextChannel.send`` so it can be queued on the SendDispatcher as is.
+    """
+
+    def __init__(self, sender: WebhookSender, name: str, url: str, on_gone=None):
+        match = _WEBHOOK_URL_RE.search(url)
+        if not match:
+            raise ValueError(f"Not a Discord webhook URL: {url}")
+        self.sender = sender
+        self.name = name
+        self.url = url
+        self.id = int(match.group(1))
+        self.guild = None
+        self.on_gone = on_gone
+
+    async def send(self, content=None, *, embed=None, embeds=None, file=None, files=None):
+        embeds = list(embeds or []) + ([embed] if embed else [])
+        files = list(files or []) + ([file] if file else [])
+        try:
+            data = await self.sender.execute(
+                self.url,
+                content=content,
+                embeds=[e.to_dict() for e in embeds],
+                files=[(f.filename, f.fp.read()) for f in files],
+            )
+        except WebhookError as e:
+            if e.status == 404 and self.on_gone is not None:
+                await self.on_gone()
+            raise
+        attachments = [SimpleNamespace(url=a.get("url"), filename=a.get("filename")) for a in data.get("attachments", [])]
+        return SimpleNamespace(id=int(data.get("id", 0)), attachments=attachments)
+
+
+class WebhookDirectory:
+    """Maps channel names to webhook targets.
+
+    Webhooks come from ``configured`` (name -> URL), from webhooks created
+    earlier (persisted in state as ``webhook:<name>``) or are created on the
+    gateway channel the first time it is seen. Channels where a webhook
+    cannot be created are remembered and left to the gateway client.
+    """
+
+    def __init__(self, sender: WebhookSender, state, configured: Optional[Dict[str, str]] = None):
+        self.sender = sender
+        self.state = state
+        self.configured = configured or {}
+        self._targets: Dict[str, WebhookChannel] = {}
+        self._unavailable = set()
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def parse(value: str) -> Dict[str, str]:
+        """Parse ``name=url,name2=url2``."""
+        configured = {}
+        for item in value.split(","):
+            name, sep, url = item.strip().partition("=")
+            if sep and name.strip() and url.strip():
+                configured[name.strip()] = url.strip()
+        return configured
+
+    async def channel_for(self, name: str, channel=None) -> Optional[WebhookChannel]:
+        """Webhook target for ``name``; ``channel`` allows creating one."""
+        target = self._targets.get(name)
+        if target is not None:
+            return target
+
+        async with self._lock:
+            target = self._targets.get(name)
+            if target is not None:
+                return target
+            url = self.configured.get(name) or await self.state.get(f"webhook:{name}")
+            if not url and channel is not None and channel.id not in self._unavailable:
+                url = await self._create(channel)
+            if not url:
+                return None
+            target = self._targets[name] = WebhookChannel(
+                self.sender, name, url, on_gone=lambda: self.forget(name)
+            )
+            return target
+
+    async def _create(self, channel) -> Optional[str]:
+        try:
+            webhook = next((w for w in await channel.webhooks() if w.name == WEBHOOK_NAME and w.token), None)
+            if webhook is None:
+                webhook = await channel.create_webhook(name=WEBHOOK_NAME)
+                logger.info(f"🪝 Created webhook for #{channel.name}")
+        except discord.HTTPException as e:
+            self._unavailable.add(channel.id)
+            logger.warning(f"Cannot use a webhook in #{channel.name}, posting through the bot: {e}")
+            return None
+        await self.state.set(f"webhook:{channel.name}", webhook.url)
+        return webhook.url
+
+    async def forget(self, name: str):
+        """Drop a webhook that no longer exists so the next send creates a new one."""
+        if self._targets.pop(name, None) is not None:
+            logger.warning(f"Webhook for #{name} is gone")
+        await self.state.set(f"webhook:{name}", None)
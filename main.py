@@ -1,12 +1,19 @@
 import asyncio
 import logging
+import os
+import signal
 from bot.config import cfg
-from bot.state import StateStore
-from services.deviantart.service import DeviantArtService
+from bot.state import create_state_store
+from bot.dedup import DedupIndex
 from services.deviantart.service import DeviantArtService
+from services.deviantart.auth import DeviantArtTokenProvider
+from services.deviantart.cadence import PollCadence
+from services.deviantart.ratelimit import DeviantArtRateLimiter
 from bot.discord_bot import DiscordPoster
 from services.service_manager import ServiceManager
+from services.http_client import HttpClient
 from services.telegram.service import TelegramService
+from utils.executor import ImageExecutor
 
 
 logging.basicConfig(level=logging.INFO)
@@ -15,9 +22,31 @@ logger = logging.getLogger(__name__)
 
 
 async def main():
-    state = StateStore(cfg.state_file)
+    state = create_state_store(
+        cfg.state_file,
+        cfg.state_backend,
+        flush_delay=cfg.state_flush_delay,
+        journal=cfg.state_journal,
+        journal_max_bytes=cfg.state_journal_max_bytes,
+    )
     svc_mgr = ServiceManager()
 
+    def make_dedup(namespace, **kwargs):
+        return DedupIndex(
+            state,
+            namespace,
+            os.path.join(os.path.dirname(cfg.state_file), f"dedup-{namespace}.bloom"),
+            max_recent=cfg.dedup_recent_max,
+            max_age=cfg.dedup_recent_max_age_days * 24 * 3600,
+            bloom_capacity=cfg.dedup_bloom_capacity,
+            error_rate=cfg.dedup_bloom_error_rate,
+            **kwargs,
+        )
+
+    # DeviantArt URLs keep their historical unprefixed keys in sent_posts
+    deviantart_dedup = make_dedup("deviantart", legacy_key="sent_posts")
+    patreon_dedup = make_dedup("patreon", exact_prefix="patreon:")
+
     # Validate Discord config
     if not cfg.discord_token:
         logger.error("❌ DISCORD_TOKEN not set in .env")
@@ -45,6 +74,24 @@ async def main():
     logger.info(f"✅ Configuration valid")
     logger.info(f"📊 Tracking {len(usernames)} artists: {', '.join(usernames)}")
     
+    # One pooled HTTP client shared by every DeviantArt service
+    http = HttpClient(
+        limit=cfg.http_pool_limit,
+        limit_per_host=cfg.http_pool_limit_per_host,
+        dns_cache_ttl=cfg.http_dns_cache_seconds,
+    )
+
+    # Request budget shared by every artist and the token endpoint
+    rate_limiter = DeviantArtRateLimiter(
+        rate=cfg.deviantart_rate_limit_rps, burst=cfg.deviantart_rate_limit_burst
+    )
+
+    # All artists share one OAuth token, refreshed ahead of expiry
+    token_provider = DeviantArtTokenProvider(
+        cfg.deviantart_client_id, cfg.deviantart_client_secret, http=http, rate_limiter=rate_limiter
+    )
+    token_provider.start()
+
     # Initialize DeviantArt services for each username
     services = []
     for username in usernames:
@@ -52,7 +99,18 @@ async def main():
             username,
             client_id=cfg.deviantart_client_id,
             client_secret=cfg.deviantart_client_secret,
-            poll_interval=cfg.poll_interval_seconds
+            poll_interval=cfg.poll_interval_seconds,
+            http=http,
+            token_provider=token_provider,
+            cadence=PollCadence(
+                min_interval=cfg.poll_min_interval_seconds,
+                max_interval=cfg.poll_max_interval_seconds,
+                factor=cfg.poll_cadence_factor,
+            ) if cfg.adaptive_polling else None,
+            page_size=cfg.deviantart_page_size,
+            max_catchup_pages=cfg.deviantart_max_catchup_pages,
+            rate_limiter=rate_limiter,
+            commit_batch_size=cfg.deviantart_commit_batch,
         )
         services.append(da)
         svc_mgr.register(f"deviantart:{username}", da)
@@ -62,15 +120,24 @@ async def main():
     discord_poster_ref = {}
     async def tg_callback(payload):
         if "poster" in discord_poster_ref:
-            await discord_poster_ref["poster"].on_telegram_post(payload)
-        else:
-            logger.warning("DiscordPoster not ready to receive Telegram post")
+            return await discord_poster_ref["poster"].on_telegram_post(payload)
+        logger.warning("DiscordPoster not ready to receive Telegram post")
+        return False
 
-    telegram_service = TelegramService(tg_callback)
+    # Pillow work (blur, re-encode) runs here instead of on the event loop
+    image_executor = ImageExecutor(
+        max_workers=cfg.image_workers or None,
+        use_processes=cfg.image_executor != "thread",
+    )
+
+    telegram_service = TelegramService(tg_callback, dedup=patreon_dedup, image_executor=image_executor)
     svc_mgr.register("telegram", telegram_service)
     logger.info("  → Telegram service initialized")
 
-    discord_poster = DiscordPoster(services, state, svc_mgr, telegram_service=telegram_service)
+    discord_poster = DiscordPoster(
+        services, state, svc_mgr, telegram_service=telegram_service, dedup=deviantart_dedup, http=http,
+        image_executor=image_executor,
+    )
     discord_poster_ref["poster"] = discord_poster
 
     logger.info("🚀 Starting Discord bot...")
@@ -78,18 +145,32 @@ async def main():
     logger.info(f"📋 Admin channel: {cfg.discord_admin_channel_name}")
     logger.info(f"⏱️  Poll interval: {cfg.poll_interval_seconds}s")
     
-    # run discord concurrently with services
-    
+    # systemd stops the bot with SIGTERM: cancel main() so the finally block
+    # below still flushes the write-back state and the dedup filters
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass  # no signal handlers on Windows event loops
+
     # run discord concurrently with services
     try:
         await asyncio.gather(
             discord_poster.start()
         )
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("⏹️ Shutting down...")
     except Exception as e:
         logger.error(f"❌ Fatal error: {e}", exc_info=True)
         raise
+    finally:
+        await discord_poster.close()
+        # Persist any state still sitting in the write-back cache
+        await deviantart_dedup.close()
+        await patreon_dedup.close()
+        await state.close()
+        await token_provider.close()
+        image_executor.shutdown()
+        await http.close()
 
 
 if __name__ == "__main__":
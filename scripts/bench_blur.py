@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Сравнивает blur_image и fast_blur_image: скорость, размер превью и похожесть
+Использование: python scripts/bench_blur.py [фото.jpg] [радиус]
+"""
+import io
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+from utils.image import blur_image, fast_blur_image
+
+RUNS = 3
+
+
+def make_photo(width: int = 2560, height: int = 1920) -> bytes:
+    """Синтетическое «фото»: градиент, фигуры и шум, как у реального JPEG из Telegram"""
+    random.seed(1)
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(60):
+        x, y = random.randrange(width), random.randrange(height)
+        r = random.randrange(40, 400)
+        color = tuple(random.randrange(256) for _ in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    img = ImageChops.add(img, noise, scale=1.3, offset=-20).filter(ImageFilter.SMOOTH)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def timed(fn, *args, **kwargs):
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def similarity(a: bytes, b: bytes):
+    """Средняя разница пикселей и PSNR после приведения к одному размеру"""
+    img_a = Image.open(io.BytesIO(a)).convert("RGB")
+    img_b = Image.open(io.BytesIO(b)).convert("RGB")
+    img_a = img_a.resize(img_b.size, Image.BICUBIC)
+    diff = ImageChops.difference(img_a, img_b)
+    stat = ImageStat.Stat(diff)
+    mean_abs = sum(stat.mean) / len(stat.mean)
+    mse = sum(v / stat.count[0] for v in stat.sum2) / len(stat.sum2)
+    psnr = 10 * math.log10(255 ** 2 / mse) if mse else float("inf")
+    return mean_abs, psnr
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            data = f.read()
+    else:
+        data = make_photo()
+    radius = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    size = Image.open(io.BytesIO(data)).size
+
+    print(f"🖼️ Исходник: {size[0]}x{size[1]}, {len(data) // 1024} KB, радиус {radius}, лучший из {RUNS}")
+
+    full, full_time = timed(blur_image, data, radius=radius)
+    fast, fast_time = timed(fast_blur_image, data, radius=radius)
+    mean_abs, psnr = similarity(full, fast)
+
+    fast_size = Image.open(io.BytesIO(fast)).size
+    print(f"   blur_image:      {full_time * 1000:8.0f} ms, {len(full) // 1024:5} KB, {size[0]}x{size[1]}")
+    print(f"   fast_blur_image: {fast_time * 1000:8.0f} ms, {len(fast) // 1024:5} KB, {fast_size[0]}x{fast_size[1]}")
+    print(f"   Ускорение:       {full_time / fast_time:.1f}x")
+    print(f"   Похожесть:       средняя разница {mean_abs:.2f}/255, PSNR {psnr:.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
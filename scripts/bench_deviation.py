@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Сравнивает память страницы галереи DeviantArt (24 поста):
+полные JSON-словари из API против компактных записей Deviation
+"""
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.deviantart.models import Deviation
+
+PAGE_SIZE = 24
+USERNAME = "artist"
+
+
+def make_api_entry(i: int) -> dict:
+    """Похоже на объект deviation из /gallery/all"""
+    return {
+        "deviationid": f"{i:08X}-1111-2222-3333-444455556666",
+        "printid": None,
+        "url": f"https://www.deviantart.com/{USERNAME}/art/Some-Artwork-{100000 + i}",
+        "title": f"Some Artwork #{i}",
+        "category": "Digital Art",
+        "category_path": "digitalart/paintings/fantasy",
+        "is_favourited": False,
+        "is_deleted": False,
+        "is_published": True,
+        "is_blocked": False,
+        "author": {
+            "userid": "ABCDEF01-2345-6789-ABCD-EF0123456789",
+            "username": USERNAME,
+            "usericon": "https://a.deviantart.net/avatars/a/r/artist.png",
+            "type": "regular",
+        },
+        "stats": {"comments": 12 + i, "favourites": 340 + i},
+        "published_time": str(1700000000 + i * 3600),
+        "allows_comments": True,
+        "preview": {
+            "src": f"https://images-wixmp.example/preview/{i}.jpg",
+            "height": 1024, "width": 768, "transparency": False,
+        },
+        "content": {
+            "src": f"https://images-wixmp.example/content/{i}.jpg",
+            "height": 4096, "width": 3072, "transparency": False, "filesize": 2345678,
+        },
+        "thumbs": [
+            {"src": f"https://images-wixmp.example/thumb/{i}-{h}.jpg", "height": h, "width": h * 3 // 4, "transparency": False}
+            for h in (150, 200, 300)
+        ],
+        "is_mature": False,
+        "is_downloadable": False,
+    }
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return obj, size
+
+
+def main():
+    # Страница как её возвращает resp.json()
+    raw = json.dumps({"results": [make_api_entry(i) for i in range(PAGE_SIZE)]})
+
+    dicts, dict_bytes = measure(lambda: json.loads(raw)["results"])
+    records, record_bytes = measure(
+        lambda: [Deviation.from_api(d, USERNAME) for d in json.loads(raw)["results"]]
+    )
+
+    print(f"📦 Страница из {PAGE_SIZE} постов")
+    print(f"   Словари из API:  {dict_bytes:>8} байт ({dict_bytes // PAGE_SIZE} на пост)")
+    print(f"   Deviation:       {record_bytes:>8} байт ({record_bytes // PAGE_SIZE} на пост)")
+    if record_bytes:
+        print(f"   Экономия:        {dict_bytes / record_bytes:.1f}x")
+    print(f"   hasattr __dict__: {hasattr(records[0], '__dict__')}")
+    del dicts, records
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+import aiohttp
+from services.deviantart.ratelimit import parse_retry_after
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeviantArtAPIError(Exception):
+    """Non-success response from the DeviantArt API."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(f"{message}: {status}")
+        self.status = status
+
+
+class DeviantArtRateLimitError(DeviantArtAPIError):
+    """429 from the DeviantArt API; ``retry_after`` is the pause applied."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message, 429)
+        self.retry_after = retry_after
+
+
+class DeviantArtTokenProvider:
+    """OAuth2 client-credentials token shared by every DeviantArtService.
+
+    Concurrent callers that find the token missing or expiring share a single
+    in-flight refresh. ``start()`` additionally refreshes the token in the
+    background ``refresh_margin`` seconds before it expires, so polls rarely
+    wait for it. Callers that get a 401 call ``invalidate()`` with the token
+    they used to force a refresh. With a ``rate_limiter`` token requests
+    share the API request budget.
+    """
+
+    TOKEN_URL = "https://www.deviantart.com/oauth2/token"
+    RATE_LIMIT_KEY = "oauth"
+
+    def __init__(self, client_id: str, client_secret: str, http=None, refresh_margin: float = 300,
+                 rate_limiter=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.http = http
+        self.rate_limiter = rate_limiter
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background: Optional[asyncio.Task] = None
+        self.refresh_count = 0
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    async def get_token(self, session: Optional[aiohttp.ClientSession] = None) -> str:
+        """Return a valid token, refreshing it (once for all callers) if needed."""
+        if self._is_fresh():
+            return self._token
+        return await self._refresh(session)
+
+    def invalidate(self, token: str):
+        """Drop ``token`` unless a newer one has already replaced it."""
+        if token == self._token:
+            self._token = None
+
+    async def _refresh(self, session: Optional[aiohttp.ClientSession]) -> str:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._request_token(session))
+        # Shield so one cancelled caller does not abort everyone else's refresh
+        return await asyncio.shield(self._refresh_task)
+
+    async def _request_token(self, session: Optional[aiohttp.ClientSession]) -> str:
+        if session is None:
+            if self.http is None:
+                async with aiohttp.ClientSession() as own_session:
+                    return await self._request_token(own_session)
+            session = self.http.session
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(self.RATE_LIMIT_KEY)
+        async with session.post(
+            self.TOKEN_URL,
+            data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            },
+        ) as resp:
+            if resp.status == 429 and self.rate_limiter is not None:
+                retry_after = self.rate_limiter.penalize(
+                    parse_retry_after(resp.headers.get("Retry-After")), self.RATE_LIMIT_KEY
+                )
+                raise DeviantArtRateLimitError("Token request rate limited", retry_after)
+            if resp.status != 200:
+                raise DeviantArtAPIError("Failed to get access token", resp.status)
+            if self.rate_limiter is not None:
+                self.rate_limiter.record_success(self.RATE_LIMIT_KEY)
+            data = await resp.json()
+        self._token = data["access_token"]
+        self._expires_at = time.monotonic() + data["expires_in"]
+        self.refresh_count += 1
+        logger.debug(f"DeviantArt access token refreshed, expires in {data['expires_in']}s")
+        return self._token
+
+    def start(self):
+        """Start proactive background refresh."""
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            if self._token is not None:
+                delay = self._expires_at - self.refresh_margin - time.monotonic()
+                await asyncio.sleep(max(delay, 60))
+            if self._is_fresh():
+                continue
+            try:
+                await self._refresh(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background DeviantArt token refresh failed: {e}")
+                await asyncio.sleep(30)
+
+    async def close(self):
+        if self._background is not None:
+            self._background.cancel()
+            try:
+                await self._background
+            except asyncio.CancelledError:
+                pass
+            self._background = None
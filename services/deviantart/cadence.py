@@ -0,0 +1,92 @@
+import statistics
+import time
+from typing import Iterable, List, Optional
+
+
+class PollCadence:
+    """Learns how often an artist publishes and turns that into a poll interval.
+
+    The interval is ``factor`` times the typical gap between publications
+    (median of the last ``history`` gaps), stretched further while the artist
+    has been quiet for longer than that, and clamped to
+    ``[min_interval, max_interval]``. Consecutive poll errors back off
+    exponentially on top of it.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 60,
+        max_interval: float = 3600,
+        factor: float = 0.05,
+        history: int = 20,
+        max_backoff_steps: int = 6,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.history = history
+        self.max_backoff_steps = max_backoff_steps
+        self.published: List[int] = []
+        self.errors = 0
+
+    def observe(self, timestamps: Iterable) -> bool:
+        """Add publish times (unix seconds); return True if anything new was learned."""
+        known = set(self.published)
+        added = False
+        for ts in timestamps:
+            try:
+                ts = int(ts)
+            except (TypeError, ValueError):
+                continue
+            if ts not in known:
+                known.add(ts)
+                added = True
+        if added:
+            self.published = sorted(known)[-self.history:]
+        return added
+
+    def median_gap(self) -> Optional[float]:
+        if len(self.published) < 2:
+            return None
+        gaps = [b - a for a, b in zip(self.published, self.published[1:])]
+        return statistics.median(gaps)
+
+    def interval(self, base: float) -> float:
+        """Seconds until the next poll; ``base`` is used until a cadence is known."""
+        low = min(self.min_interval, self.max_interval)
+        gap = self.median_gap()
+        if gap is None:
+            interval = base
+        else:
+            quiet_for = time.time() - self.published[-1]
+            interval = max(gap, quiet_for) * self.factor
+        interval = min(max(interval, low), self.max_interval)
+        if self.errors:
+            steps = min(self.errors, self.max_backoff_steps)
+            interval = min(interval * (2 ** steps), max(self.max_interval, interval))
+        return interval
+
+    def to_state(self) -> dict:
+        return {"published": self.published, "median_gap": self.median_gap()}
+
+    def load_state(self, data: Optional[dict]):
+        if data:
+            self.observe(data.get("published") or [])
+
+    def describe(self, base: float) -> str:
+        gap = self.median_gap()
+        learned = f"posts every ~{_human(gap)}" if gap is not None else "cadence unknown"
+        text = f"{learned}, polled every {_human(self.interval(base))}"
+        if self.errors:
+            text += f" (backing off, {self.errors} errors)"
+        return text
+
+
+def _human(seconds: float) -> str:
+    if seconds >= 86400:
+        return f"{seconds / 86400:.1f}d"
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds:.0f}s"
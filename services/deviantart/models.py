@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Deviation:
+    """The few fields of a DeviantArt deviation the bot actually uses.
+
+    Built by ``from_api`` right after a gallery page is decoded, so the full
+    API objects (stats, author, every thumb size, content...) are dropped
+    immediately instead of being carried through callbacks.
+    """
+
+    __slots__ = ("deviationid", "title", "url", "thumb_url", "published_time", "username")
+
+    deviationid: Optional[str]
+    title: str
+    url: str
+    thumb_url: Optional[str]
+    published_time: Optional[str]
+    username: str
+
+    @classmethod
+    def from_api(cls, data: dict, username: str) -> "Deviation":
+        # thumbs is a list of dicts with 'src', 'height', 'width'
+        thumb_url = None
+        thumbs = data.get("thumbs") or []
+        if thumbs:
+            thumb_obj = thumbs[0]
+            if isinstance(thumb_obj, dict):
+                thumb_url = thumb_obj.get("src")
+            else:
+                thumb_url = str(thumb_obj)
+
+        author = data.get("author")
+        if isinstance(author, dict) and author.get("username"):
+            username = author["username"]
+
+        return cls(
+            deviationid=data.get("deviationid"),
+            title=data.get("title") or "No title",
+            url=data.get("url") or "#",
+            thumb_url=thumb_url,
+            # Extract unix timestamp from published_time or use published timestamp
+            published_time=data.get("published_time") or data.get("date"),
+            username=username,
+        )
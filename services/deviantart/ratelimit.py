@@ -0,0 +1,115 @@
+import asyncio
+import email.utils
+import logging
+import time
+from typing import Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class DeviantArtRateLimiter:
+    """Token bucket shared by every request to the DeviantArt API.
+
+    ``acquire()`` hands out ``rate`` requests per second with bursts of up to
+    ``burst``; callers wait in FIFO order when the bucket is empty. A 429
+    reported through ``penalize()`` holds only the requests made under the
+    same ``key`` (an artist's gallery, the OAuth token endpoint) until
+    ``Retry-After`` has passed, or for an exponentially growing backoff when
+    the API does not say how long to wait. Other keys keep polling.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 5, default_backoff: float = 30, max_backoff: float = 900):
+        if rate <= 0:
+            raise ValueError(f"DeviantArt rate limit must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.default_backoff = default_backoff
+        self.max_backoff = max_backoff
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until: Dict[str, float] = {}
+        self._consecutive_429: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, key: str = ""):
+        """Wait until a request under ``key`` may be sent."""
+        started = time.monotonic()
+        waited = False
+        # A paused key waits outside the lock so it does not hold up the others
+        while True:
+            delay = self._paused_until.get(key, 0.0) - time.monotonic()
+            if delay <= 0:
+                break
+            waited = True
+            await asyncio.sleep(delay)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                waited = True
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        self.requests += 1
+        if waited:
+            self.throttled += 1
+            self.total_wait += time.monotonic() - started
+
+    def penalize(self, retry_after: Optional[float] = None, key: str = "") -> float:
+        """Record a 429 and pause requests under ``key``; returns the pause length."""
+        count = self._consecutive_429[key] = self._consecutive_429.get(key, 0) + 1
+        self.rate_limited += 1
+        if retry_after is None:
+            retry_after = min(self.default_backoff * 2 ** (count - 1), self.max_backoff)
+        now = time.monotonic()
+        self._paused_until[key] = max(self._paused_until.get(key, 0.0), now + retry_after)
+        logger.warning(
+            f"DeviantArt rate limit hit{' for ' + key if key else ''}, "
+            f"pausing those requests for {retry_after:.0f}s"
+        )
+        return retry_after
+
+    def record_success(self, key: str = ""):
+        self._consecutive_429.pop(key, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._refill(now)
+        paused = [until - now for until in self._paused_until.values() if until > now]
+        return {
+            "tokens": round(self._tokens, 2),
+            "rate": self.rate,
+            "burst": self.burst,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+            "total_wait": round(self.total_wait, 1),
+            "avg_wait": round(self.total_wait / self.throttled, 2) if self.throttled else 0.0,
+            "paused": len(paused),
+            "paused_for": round(max(paused, default=0.0), 1),
+        }
@@ -1,8 +1,16 @@
 import asyncio
+import inspect
 import logging
-from typing import Callable, List, Optional
+from typing import AsyncIterator, List, Optional
 import aiohttp
-from datetime import datetime, timedelta
+from services.deviantart.auth import (
+    DeviantArtAPIError,
+    DeviantArtRateLimitError,
+    DeviantArtTokenProvider,
+)
+from services.deviantart.cadence import PollCadence
+from services.deviantart.models import Deviation
+from services.deviantart.ratelimit import DeviantArtRateLimiter, parse_retry_after
 
 
 logger = logging.getLogger(__name__)
@@ -12,7 +20,8 @@ class DeviantArtService:
     """Polls DeviantArt API v1 for user gallery deviations."""
 
     API_BASE = "https://www.deviantart.com/api/v1/oauth2"
-    TOKEN_URL = "https://www.deviantart.com/oauth2/token"
+    MAX_PAGE_SIZE = 24  # API limit for gallery/all
+    RATE_LIMIT_RETRIES = 2
 
     def __init__(
         self,
@@ -20,93 +29,343 @@ class DeviantArtService:
         client_id: str,
         client_secret: str,
         poll_interval: int = 60,
+        http=None,
+        token_provider: Optional[DeviantArtTokenProvider] = None,
+        cadence: Optional[PollCadence] = None,
+        page_size: int = 5,
+        max_catchup_pages: int = 20,
+        rate_limiter: Optional[DeviantArtRateLimiter] = None,
+        commit_batch_size: int = 10,
+        delivery_timeout: float = 900.0,
     ):
+        """
+        Args:
+            http: shared ``HttpClient``; without one every poll opens and
+                closes its own ``aiohttp.ClientSession``.
+            token_provider: shared ``DeviantArtTokenProvider``; a private one
+                is created from the credentials if omitted.
+            cadence: ``PollCadence`` enabling adaptive poll intervals; without
+                one every poll waits ``poll_interval``.
+            page_size: gallery page size requested when caught up.
+            max_catchup_pages: upper bound on pages read in one poll.
+            rate_limiter: ``DeviantArtRateLimiter`` shared by all artists so
+                the request budget is global; a private one if omitted.
+            commit_batch_size: entries posted per ``last_timestamp`` commit.
+            delivery_timeout: seconds a queued batch may take to be delivered
+                before its commit is given up and left to the next poll.
+        """
         self.username = username
         self.client_id = client_id
         self.client_secret = client_secret
         self.poll_interval = poll_interval
+        self.http = http
+        self.rate_limiter = rate_limiter or DeviantArtRateLimiter()
+        self.token_provider = token_provider or DeviantArtTokenProvider(
+            client_id, client_secret, http=http, rate_limiter=self.rate_limiter
+        )
+        self.cadence = cadence
+        self.page_size = max(1, min(page_size, self.MAX_PAGE_SIZE))
+        self.max_catchup_pages = max_catchup_pages
+        self.commit_batch_size = max(1, commit_batch_size)
+        self.delivery_timeout = delivery_timeout
+        self._cadence_loaded = False
+        self._last_commit: Optional[asyncio.Task] = None
         self._running = False
-        self._access_token: Optional[str] = None
-        self._token_expire_time: Optional[datetime] = None
+
+    @property
+    def cadence_key(self) -> str:
+        return f"{self.username}:cadence"
 
     async def _get_access_token(self, session: aiohttp.ClientSession) -> str:
         """Get or refresh OAuth2 client credentials access token."""
-        now = datetime.utcnow()
-        if self._access_token and self._token_expire_time and now < self._token_expire_time:
-            return self._access_token
-
-        async with session.post(
-            self.TOKEN_URL,
-            data={
-                "grant_type": "client_credentials",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-            },
-        ) as resp:
-            if resp.status != 200:
-                raise Exception(f"Failed to get access token: {resp.status}")
-            data = await resp.json()
-            self._access_token = data["access_token"]
-            # set expiry time to 55 minutes (token expires in 1 hour)
-            self._token_expire_time = now + timedelta(seconds=data["expires_in"] - 300)
-            return self._access_token
+        return await self.token_provider.get_token(session)
 
     async def fetch_gallery(
-        self, session: aiohttp.ClientSession, access_token: str
+        self,
+        session: aiohttp.ClientSession,
+        access_token: str,
+        offset: int = 0,
+        limit: int = 24,
     ) -> dict:
-        """Fetch user gallery deviations from API."""
+        """Fetch one page of user gallery deviations from API."""
         headers = {"Authorization": f"Bearer {access_token}"}
-        params = {"username": self.username, "limit": 24}
+        # No ``expand`` and no session block: only the base deviation objects
+        params = {
+            "username": self.username,
+            "offset": offset,
+            "limit": limit,
+            "with_session": "false",
+        }
+        key = f"gallery:{self.username}"
+        await self.rate_limiter.acquire(key)
         async with session.get(
             f"{self.API_BASE}/gallery/all", headers=headers, params=params
         ) as resp:
+            if resp.status == 429:
+                retry_after = self.rate_limiter.penalize(
+                    parse_retry_after(resp.headers.get("Retry-After")), key
+                )
+                raise DeviantArtRateLimitError("Gallery request rate limited", retry_after)
             if resp.status != 200:
-                raise Exception(f"Failed to fetch gallery: {resp.status}")
+                raise DeviantArtAPIError("Failed to fetch gallery", resp.status)
+            self.rate_limiter.record_success(key)
             return await resp.json()
 
-    async def poll_once(self, last_timestamp: Optional[str]) -> List[dict]:
-        """Poll gallery and return new deviations since last_timestamp."""
-        async with aiohttp.ClientSession() as session:
+    async def _fetch_with_auth(
+        self, session: aiohttp.ClientSession, offset: int = 0, limit: int = 24
+    ) -> dict:
+        """Fetch a gallery page.
+
+        Re-authenticates once if the token is rejected. A 429 pauses this
+        artist's requests in the shared rate limiter and the request is
+        retried (up to ``RATE_LIMIT_RETRIES`` times) once the pause is over.
+        """
+        reauthenticated = False
+        retries = 0
+        while True:
             token = await self._get_access_token(session)
-            data = await self.fetch_gallery(session, token)
+            try:
+                return await self.fetch_gallery(session, token, offset, limit)
+            except DeviantArtRateLimitError:
+                if retries >= self.RATE_LIMIT_RETRIES:
+                    raise
+                retries += 1
+            except DeviantArtAPIError as e:
+                if e.status != 401 or reauthenticated:
+                    raise
+                logger.info(f"DeviantArt token rejected while polling {self.username}, re-authenticating")
+                self.token_provider.invalidate(token)
+                reauthenticated = True
+
+    async def iter_gallery(
+        self, session: aiohttp.ClientSession, last_timestamp: Optional[str], seen: Optional[list] = None
+    ) -> AsyncIterator[Deviation]:
+        """Yield deviations newer than ``last_timestamp``, newest first.
+
+        When caught up only a small page (``page_size``) is requested. While
+        every entry of a page is still new the next page is fetched via
+        ``next_offset`` with a doubled page size, until the watermark is
+        reached or ``max_catchup_pages`` pages were read. Without a watermark
+        only the first full page is returned. The publish times of every
+        fetched entry, old ones included, are appended to ``seen``.
+        """
+        limit = self.page_size if last_timestamp else self.MAX_PAGE_SIZE
+        offset = 0
+        for _ in range(self.max_catchup_pages):
+            data = await self._fetch_with_auth(session, offset, limit)
+            # Project right away so the raw page can be released
+            deviations = [Deviation.from_api(d, self.username) for d in data.get("results", [])]
+            has_more = data.get("has_more")
+            next_offset = data.get("next_offset")
+            del data
+            if seen is not None:
+                seen.extend(d.published_time for d in deviations if d.published_time)
+
+            for deviation in deviations:
+                pub_time = deviation.published_time
+                if pub_time and last_timestamp:
+                    if pub_time <= last_timestamp:
+                        return
+                yield deviation
+
+            if not last_timestamp or not has_more or next_offset is None:
+                return
+            offset = next_offset
+            limit = min(limit * 2, self.MAX_PAGE_SIZE)
+
+        logger.warning(
+            f"Stopped catching up {self.username} after {self.max_catchup_pages} pages; "
+            f"older deviations were skipped"
+        )
+
+    async def iter_new(
+        self, last_timestamp: Optional[str], seen: Optional[list] = None
+    ) -> AsyncIterator[Deviation]:
+        """Yield deviations newer than ``last_timestamp``, oldest first."""
+        if self.http is not None:
+            entries = [d async for d in self.iter_gallery(self.http.session, last_timestamp, seen)]
+        else:
+            async with aiohttp.ClientSession() as session:
+                entries = [d async for d in self.iter_gallery(session, last_timestamp, seen)]
+
+        for deviation in reversed(entries):
+            yield deviation
+
+    async def poll_once(self, last_timestamp: Optional[str]) -> List[Deviation]:
+        """Poll gallery and return new deviations since last_timestamp, oldest first."""
+        return [d async for d in self.iter_new(last_timestamp)]
+
+    async def _commit(self, writes, state_setter, state_transaction):
+        if state_transaction is None:
+            for key, value in writes.items():
+                await state_setter(key, value)
+            return
+        async with state_transaction() as txn:
+            for key, value in writes.items():
+                await txn.set(key, value)
+
+    async def _commit_when_delivered(self, deliveries, writes, state_setter, state_transaction, after, previous):
+        """Commit ``writes`` once every delivery succeeded; returns whether it did.
 
-        results = data.get("results", [])
-        new_entries = []
+        ``after`` is the previous batch of the same poll: if it was not
+        committed, neither is this one, so the watermark never skips a post
+        that failed. ``previous`` (an earlier poll's commit) is waited for to
+        keep the commits in order. Both waits are bounded by
+        ``delivery_timeout`` so one stuck send cannot hold back the artist's
+        later commits; running out of time counts as a failure.
+        """
+        futures = [asyncio.ensure_future(d) for d in deliveries]
+        done, pending = set(), set()
+        if futures:
+            done, pending = await asyncio.wait(futures, timeout=self.delivery_timeout)
+        errors = [
+            asyncio.CancelledError("delivery cancelled") if f.cancelled() else f.exception()
+            for f in done
+            if f.cancelled() or f.exception() is not None
+        ]
+        for error in errors:
+            logger.error(f"Post for {self.username} was not delivered, retrying on the next poll: {error}")
+        if pending:
+            logger.error(
+                f"{len(pending)} post(s) for {self.username} not delivered after "
+                f"{self.delivery_timeout:.0f}s, retrying on the next poll"
+            )
+            for future in pending:
+                # Still running; they record themselves if they get through
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if previous is not None and previous is not after:
+            done, _ = await asyncio.wait({previous}, timeout=self.delivery_timeout)
+            if not done:
+                logger.error(f"Earlier commit for {self.username} is still pending, skipping this one")
+                return False
+        if errors or pending or (after is not None and not await after):
+            return False
+        try:
+            await self._commit(writes, state_setter, state_transaction)
+        except Exception as e:
+            logger.error(f"Failed to commit progress for {self.username}: {e}", exc_info=True)
+            return False
+        return True
 
-        for deviation in results:
-            # Extract unix timestamp from published_time or use published timestamp
-            pub_time = deviation.get("published_time") or deviation.get("date")
-            if pub_time and last_timestamp:
-                if pub_time <= last_timestamp:
-                    break
-            new_entries.append(deviation)
+    async def _process_batch(self, batch, writes, state_setter, poll_callback, state_transaction, after=None):
+        """Post ``batch`` (oldest first), then commit the watermark once.
 
-        return new_entries
+        ``writes`` are extra key/values committed along with it, in one
+        ``state_transaction`` if given. If a callback raises nothing is
+        committed and the batch is retried on the next poll.
 
-    async def start(self, state_getter, state_setter, poll_callback):
-        """Start polling loop for gallery updates."""
+        A callback may return an awaitable that completes once its post was
+        delivered (the poster only queues it). The watermark is then
+        committed in the background after all of them succeeded, and the task
+        doing that is returned; otherwise None. The callback records its own
+        posts as they are delivered; those records are not part of the
+        watermark commit.
+        """
+        timestamps = [entry.published_time for entry in batch if entry.published_time]
+        if timestamps:
+            writes = {**writes, f"{self.username}:last_timestamp": timestamps[-1]}
+
+        # Nothing queued and no earlier commit pending: commit right away
+        commit_now = after is None and self._last_commit is None
+        results = [await poll_callback(self, entry) for entry in batch]
+        deliveries = [r for r in results if inspect.isawaitable(r)]
+        if not deliveries and commit_now:
+            await self._commit(writes, state_setter, state_transaction)
+            return None
+
+        task = asyncio.ensure_future(self._commit_when_delivered(
+            deliveries, writes, state_setter, state_transaction, after, self._last_commit
+        ))
+        self._last_commit = task
+        task.add_done_callback(self._commit_done)
+        return task
+
+    def _commit_done(self, task):
+        if self._last_commit is task:
+            self._last_commit = None
+
+    async def poll_step(self, state_getter, state_setter, poll_callback, state_transaction=None):
+        """Run one poll: fetch new deviations and hand each to ``poll_callback``.
+
+        Entries are handled oldest first in batches of ``commit_batch_size``;
+        ``last_timestamp`` is committed once per batch, after its entries
+        were posted, in one ``state_transaction`` (e.g.
+        ``StateStore.transaction``) if given. When the callback only queues
+        its posts the watermark is committed in the background once they
+        were delivered (see ``_process_batch``).
+        Errors are logged, not raised.
+        """
+        # Check for updated poll interval from state
+        current_interval = await state_getter("poll_interval_seconds")
+        if current_interval:
+            self.poll_interval = current_interval
+
+        if self.cadence is not None and not self._cadence_loaded:
+            self.cadence.load_state(await state_getter(self.cadence_key))
+            self._cadence_loaded = True
+
+        last_ts = await state_getter(f"{self.username}:last_timestamp")
+        try:
+            # Publish times of everything fetched, not just the new entries,
+            # so the cadence is learned even when nothing is new
+            published = []
+            new_entries = [entry async for entry in self.iter_new(last_ts, published)]
+
+            cadence_writes = {}
+            if self.cadence is not None:
+                if self.cadence.observe(published):
+                    cadence_writes[self.cadence_key] = self.cadence.to_state()
+
+            size = self.commit_batch_size
+            commit = None
+            for start in range(0, len(new_entries), size):
+                batch = new_entries[start:start + size]
+                is_last = start + size >= len(new_entries)
+                commit = await self._process_batch(
+                    batch,
+                    cadence_writes if is_last else {},
+                    state_setter,
+                    poll_callback,
+                    state_transaction,
+                    after=commit,
+                )
+            if not new_entries:
+                # Nothing to post, but the cadence may still have learned something
+                for key, value in cadence_writes.items():
+                    await state_setter(key, value)
+
+            if self.cadence is not None:
+                self.cadence.errors = 0
+        except Exception as e:
+            if self.cadence is not None:
+                self.cadence.errors += 1
+            logger.error(
+                f"Error polling {self.username}: {e}", exc_info=True
+            )
+
+    def next_poll_delay(self) -> float:
+        """Seconds until this artist should be polled again."""
+        if self.cadence is None:
+            return self.poll_interval
+        return self.cadence.interval(self.poll_interval)
+
+    def describe_cadence(self) -> str:
+        if self.cadence is None:
+            return f"polled every {self.poll_interval}s"
+        return self.cadence.describe(self.poll_interval)
+
+    async def start(self, state_getter, state_setter, poll_callback, state_transaction=None):
+        """Start a standalone polling loop for gallery updates.
+
+        The bot itself drives ``poll_step`` through ``PollScheduler``; this
+        loop is kept for scripts that poll a single artist.
+        """
         self._running = True
         logger.info(f"Starting DeviantArt service for user: {self.username}")
 
         while self._running:
-            # Check for updated poll interval from state
-            current_interval = await state_getter("poll_interval_seconds")
-            if current_interval:
-                self.poll_interval = current_interval
-            
-            last_ts = await state_getter(f"{self.username}:last_timestamp")
-            try:
-                new_entries = await self.poll_once(last_ts)
-                for entry in new_entries:
-                    await poll_callback(self, entry)
-                    ts = entry.get("published_time") or entry.get("date")
-                    if ts:
-                        await state_setter(f"{self.username}:last_timestamp", ts)
-            except Exception as e:
-                logger.error(
-                    f"Error polling {self.username}: {e}", exc_info=True
-                )
-            await asyncio.sleep(self.poll_interval)
+            await self.poll_step(state_getter, state_setter, poll_callback, state_transaction)
+            await asyncio.sleep(self.next_poll_delay())
 
     def stop(self):
         """Stop the polling loop."""
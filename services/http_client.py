@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Optional
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """Process-wide aiohttp session with a persistent, pooled connector.
+
+    Connections are kept alive between requests and DNS answers are cached,
+    so repeated calls to the same host skip the DNS/TCP/TLS setup. The
+    session is created lazily inside the running event loop; call
+    ``close()`` on shutdown.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 60,
+        timeout: float = 30,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Give the connector a moment to close underlying SSL transports
+            await asyncio.sleep(0.25)
+        self._session = None
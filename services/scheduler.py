@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """Single loop that decides when each polled service runs.
+
+    Every service registered in the ``ServiceManager`` that has a
+    ``poll_step`` method gets an entry in a min-heap of next-poll deadlines.
+    Initial deadlines are spread evenly across the poll interval and every
+    reschedule adds +/- ``jitter`` (fraction of the interval), so artists do
+    not all wake at the same instant. At most ``max_concurrency`` polls run at
+    once. Paused services keep their slot in the heap and are simply skipped
+    until resumed; nothing is cancelled.
+    """
+
+    def __init__(self, service_manager, max_concurrency: int = 4, jitter: float = 0.1):
+        self.service_manager = service_manager
+        self.max_concurrency = max(1, max_concurrency)
+        self.jitter = jitter
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._wake = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._next_run: Dict[str, float] = {}
+        self._running = False
+
+    def _schedulable(self) -> List[str]:
+        return [
+            name for name, svc in self.service_manager.services.items()
+            if hasattr(svc, "poll_step")
+        ]
+
+    def _interval(self, service) -> float:
+        if hasattr(service, "next_poll_delay"):
+            return service.next_poll_delay()
+        return getattr(service, "poll_interval", 60)
+
+    def _push(self, name: str, deadline: float):
+        self._seq += 1
+        self._next_run[name] = deadline
+        heapq.heappush(self._heap, (deadline, self._seq, name))
+        self._wake.set()
+
+    def _reschedule(self, name: str, service):
+        interval = self._interval(service)
+        spread = interval * self.jitter
+        self._push(name, time.monotonic() + interval + random.uniform(-spread, spread))
+
+    def next_run_in(self, name: str) -> float:
+        """Seconds until ``name`` is due (negative if overdue), or -1 if unknown."""
+        deadline = self._next_run.get(name)
+        if deadline is None:
+            return -1
+        return deadline - time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._heap),
+            "in_flight": len(self._in_flight),
+            "max_concurrency": self.max_concurrency,
+        }
+
+    async def _run_one(self, name: str, service, poll: Callable[[object], Awaitable[None]]):
+        try:
+            await poll(service)
+        except Exception as e:
+            logger.error(f"Scheduled poll of {name} failed: {e}", exc_info=True)
+        finally:
+            self._semaphore.release()
+            self._in_flight.pop(name, None)
+            if self._running:
+                self._reschedule(name, service)
+
+    async def run(self, poll: Callable[[object], Awaitable[None]]):
+        """Run forever, calling ``await poll(service)`` whenever one is due."""
+        self._running = True
+        names = self._schedulable()
+        now = time.monotonic()
+        for i, name in enumerate(names):
+            service = self.service_manager.get(name)
+            offset = self._interval(service) * i / max(len(names), 1)
+            self._push(name, now + offset)
+        logger.info(
+            f"Poll scheduler started for {len(names)} services "
+            f"(max {self.max_concurrency} concurrent)"
+        )
+
+        try:
+            while self._running:
+                if not self._heap:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+
+                deadline, _, name = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    # Wake early if something is pushed in front of this entry
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                service = self.service_manager.get(name)
+                if service is None:
+                    self._next_run.pop(name, None)
+                    continue
+                if self.service_manager.is_paused(name) or name in self._in_flight:
+                    self._reschedule(name, service)
+                    continue
+
+                await self._semaphore.acquire()
+                self._in_flight[name] = asyncio.create_task(self._run_one(name, service, poll))
+        finally:
+            self._running = False
+            for task in list(self._in_flight.values()):
+                task.cancel()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
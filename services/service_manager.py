@@ -27,6 +27,9 @@ class ServiceManager:
         if name in self._services:
             self._paused[name] = False
             svc = self._services[name]
+            if hasattr(svc, "poll_step"):
+                # PollScheduler skips paused services and picks this one up again
+                return True
             if hasattr(svc, "start"):
                 # starting will run loop; caller is responsible for awaiting
                 return True
@@ -1,19 +1,33 @@
 import logging
 import asyncio
+import inspect
 import re
+import time
 from telegram import Update
 from telegram.ext import Application, ApplicationBuilder, ContextTypes, MessageHandler, filters
 from bot.config import cfg
 from services.patreon.client import PatreonClient
-from utils.image import blur_image
+from utils.image import render_renditions_async
+from utils.variants import VariantCache
 
 
 logger = logging.getLogger(__name__)
 
 
 class TelegramService:
-    def __init__(self, discord_poster_callback):
+    def __init__(self, discord_poster_callback, dedup=None, image_executor=None, variants=None):
         self.callback = discord_poster_callback
+        self.dedup = dedup  # DedupIndex keyed by Patreon post id
+        self.image_executor = image_executor  # ImageExecutor for Pillow work
+        # Blurred previews etc., shared by every target of a post and by re-forwards
+        self.variants = variants or VariantCache(
+            max_entries=cfg.image_variant_cache_size,
+            max_bytes=cfg.image_variant_cache_mb * 1024 * 1024,
+        )
+        # Bounds concurrent deliveries to target channels
+        self.fanout_semaphore = asyncio.Semaphore(max(1, cfg.telegram_fanout_concurrency))
+        # Bounds concurrent photo downloads from Telegram
+        self.download_semaphore = asyncio.Semaphore(max(1, cfg.telegram_download_concurrency))
         self.patreon = PatreonClient(cfg.patreon_access_token)
         self.app: Application = None
         self._running = False
@@ -43,6 +57,9 @@ class TelegramService:
         # Album buffering
         self.album_buffer = {} # media_group_id -> [messages]
         self.album_tasks = {} # media_group_id -> asyncio.Task
+        # Posts being forwarded: queued but not settled yet
+        self._in_progress = set()
+        self._settling = set()
 
 
     async def start(self):
@@ -109,6 +126,67 @@ class TelegramService:
             del self.album_tasks[group_id]
 
 
+    async def _download_photo(self, msg, index: int):
+        """Download the largest size of a message's photo; None on failure."""
+        async with self.download_semaphore:
+            try:
+                p = msg.photo[-1]
+                f = await msg.get_bot().get_file(p.file_id)
+                return await f.download_as_bytearray()
+            except Exception as e:
+                logger.error(f"Failed to download image {index} of album: {e}")
+                return None
+
+    async def _deliver(self, kind: str, ch_name: str, make_payload):
+        """Build one payload and hand it to the callback without waiting for delivery.
+
+        Returns (kind, channel, started, delivery) where ``delivery`` is what
+        the callback returned: a future for the queued messages, or a plain
+        result (None/False when nothing was queued).
+        """
+        started = time.monotonic()
+        delivery = None
+        async with self.fanout_semaphore:
+            try:
+                payload = await make_payload()
+                if payload is not None:
+                    delivery = await self.callback(payload)
+            except Exception as e:
+                logger.error(f"Failed to deliver {kind} to #{ch_name}: {e}", exc_info=True)
+        return kind, ch_name, started, delivery
+
+    async def _settle(self, post_id: str, queued):
+        """Wait for the queued deliveries of a post, then log it and record it if all succeeded."""
+        async def outcome(kind, ch_name, started, delivery):
+            try:
+                if inspect.isawaitable(delivery):
+                    delivery = await delivery
+                ok = delivery is not None and delivery is not False
+            except Exception as e:
+                logger.error(f"Failed to deliver {kind} to #{ch_name}: {e}")
+                ok = False
+            return kind, ch_name, time.monotonic() - started, ok
+
+        try:
+            results = await asyncio.gather(*(outcome(*q) for q in queued))
+            self._log_fanout(post_id, results)
+            # Only a fully delivered post counts as forwarded; otherwise a
+            # re-forward of it is sent again
+            if not results or not all(ok for *_, ok in results):
+                logger.warning(f"Patreon post {post_id} was not delivered everywhere, not marking it forwarded")
+            elif self.dedup:
+                await self.dedup.add(post_id)
+        finally:
+            self._in_progress.discard(post_id)
+
+    def _finish(self, post_id: str, deliveries):
+        """Settle a post's deliveries in the background so the handler can return."""
+        async def run():
+            await self._settle(post_id, await asyncio.gather(*deliveries))
+        task = asyncio.create_task(run())
+        self._settling.add(task)
+        task.add_done_callback(self._settling.discard)
+
     async def process_group(self, group_id: str):
         if group_id not in self.album_buffer:
             return
@@ -140,6 +218,19 @@ class TelegramService:
 
         post_id = match.group(1)
         url = match.group(0)
+
+        if post_id in self._in_progress or (self.dedup and await self.dedup.contains(post_id)):
+            logger.info(f"⏭️ Skipping already forwarded Patreon post: {post_id}")
+            return
+        self._in_progress.add(post_id)
+        try:
+            await self._forward(post_id, url, caption, messages)
+        except BaseException:
+            self._in_progress.discard(post_id)
+            raise
+
+    async def _forward(self, post_id: str, url: str, caption: str, messages):
+        """Queue the announcements and collections of a post; delivery is settled in the background."""
         
         # Extract tags from the matched caption
         tags = [t.strip("#").lower() for t in caption.split() if t.startswith("#")]
@@ -160,10 +251,17 @@ class TelegramService:
         # --- FLOW 1: ANNOUNCEMENTS (Single Image, Blurred) ---
         # Take the first image (or the one with caption? User said "first image from group")
         # Let's take specific first message from sorted list
-        first_msg = messages[0]
-        first_photo = first_msg.photo[-1]
-        file = await first_msg.get_bot().get_file(first_photo.file_id)
-        first_image_bytes = await file.download_as_bytearray()
+        # Every photo is downloaded once, all in parallel; both flows share them
+        downloads = [
+            asyncio.create_task(self._download_photo(msg, i)) for i, msg in enumerate(messages)
+        ]
+        first_image_bytes = await downloads[0]
+        if first_image_bytes is None:
+            for task in downloads:
+                task.cancel()
+            logger.error(f"Skipping Patreon post {post_id}: first image could not be downloaded")
+            self._in_progress.discard(post_id)
+            return
         
         # Announcement Targets
         ann_targets = []
@@ -187,44 +285,71 @@ class TelegramService:
             else:
                 unique_ann_targets[ch] = blur
                 
-        # Send Announcements
-        for ch_name, should_blur in unique_ann_targets.items():
-            processed = first_image_bytes
+        # Send Announcements, all target channels concurrently.
+        # One immutable copy of the preview source; its renditions are made in
+        # a single decode (per content hash) and shared by every channel.
+        original = bytes(first_image_bytes)
+        original_key = VariantCache.key(original)
+        blur_radius = 80 if any(unique_ann_targets.values()) else 0
+        # Fast (downscale-first) preview, or blur_image's exact full-resolution blur
+        blur_mode = f"fast:{cfg.blur_preview_width}" if cfg.blur_fast else "exact"
+        preview_variant = f"preview:blur{blur_radius}:{blur_mode}:{self._budget_variant()}"
+
+        def render_preview():
+            return render_renditions_async(
+                original, executor=self.image_executor,
+                blur_radius=blur_radius, preview_width=cfg.blur_preview_width, exact_blur=not cfg.blur_fast,
+                **self._budget_kwargs(),
+            )
+
+        renditions = {}
+        try:
+            renditions = await self.variants.get(original, preview_variant, render_preview, source_key=original_key)
+            for name, data in renditions.items():
+                logger.info(f"🗜️ Preview {post_id} ({name}): {self._kb(len(original))} → {self._kb(len(data))}")
+        except Exception as e:
+            logger.error(f"Failed to render preview: {e}")
+
+        async def announcement(ch_name, should_blur):
+            processed = renditions.get("full", original)
+            filename = f"preview_{post_id}{self._extension(processed)}"
             if should_blur:
-                try:
-                    processed = blur_image(bytes(first_image_bytes), radius=80)
-                except Exception as e:
-                    logger.error(f"Failed to blur: {e}")
-                    processed = None
+                processed = renditions.get("blurred")
+                filename = f"preview_{post_id}.jpg"
             
-            if processed:
-                payload = {
-                    "source": "telegram",
-                    "title": title,
-                    "url": url,
-                    "target_channel_name": ch_name,
-                    "image_bytes": processed,
-                    "filename": f"preview_{post_id}.jpg"
-                }
-                await self.callback(payload)
-                logger.info(f"📢 Announcement: {post_id} -> #{ch_name}")
+            if not processed:
+                return None
+            logger.info(f"📢 Announcement: {post_id} -> #{ch_name}")
+            return {
+                "source": "telegram",
+                "title": title,
+                "url": url,
+                "target_channel_name": ch_name,
+                "image_bytes": processed,
+                "filename": filename
+            }
+
+        deliveries = [
+            asyncio.create_task(
+                self._deliver("announcement", ch_name, lambda c=ch_name, b=should_blur: announcement(c, b))
+            )
+            for ch_name, should_blur in unique_ann_targets.items()
+        ]
 
         # --- FLOW 2: COLLECTIONS (All Images, Unblurred) ---
-        # Collect all images
-        # We need to download all images. This might take time.
-        # Max limit? Telegram albums are max 10 images.
-        
-        col_images = []
-        for i, msg in enumerate(messages):
-            try:
-                p = msg.photo[-1]
-                f = await msg.get_bot().get_file(p.file_id)
-                b = await f.download_as_bytearray()
-                col_images.append((f"img_{i}.jpg", b))
-            except Exception as e:
-                logger.error(f"Failed to download image {i} for collection: {e}")
+        # Telegram albums are max 10 images; downloads started above
+        col_images = [
+            (f"img_{i}{self._extension(b)}", b)
+            for i, b in enumerate(await self._fit_collection(
+                post_id, await asyncio.gather(*downloads),
+                # The preview render already produced the first photo's full rendition
+                first=renditions.get("full", original) if renditions else None,
+            ))
+            if b is not None
+        ]
 
         if not col_images:
+            self._finish(post_id, deliveries)
             return
 
         # Collection Targets
@@ -252,9 +377,7 @@ class TelegramService:
             if has_nsfw: col_targets.add(self.col_mappings["nsfw"])
             if has_futa: col_targets.add(self.col_mappings["futa"])
             
-        for ch_name in col_targets:
-            if not ch_name: continue
-            
+        async def collection(ch_name):
             # Send Collection Payload
             # We need to send text + files
             # DiscordPoster needs update to handle 'files' list
@@ -265,7 +388,8 @@ class TelegramService:
             # API call `get_post_title` only fetched title.
             # I will add Title + URL to the payload logic.
             
-            payload = {
+            logger.info(f"📚 Collection: {post_id} -> #{ch_name} ({len(col_images)} images)")
+            return {
                 "source": "telegram_collection",
                 "title": title,
                 "url": url,
@@ -273,6 +397,71 @@ class TelegramService:
                 "files": col_images, # List of (filename, bytes)
                 "description": f"✨ **New Collection Dropped!** ✨\n\n**{title}**\n\n🔥 **Check it out here:** <{url}>" 
             }
-            
-            await self.callback(payload)
-            logger.info(f"📚 Collection: {post_id} -> #{ch_name} ({len(col_images)} images)")
+
+        deliveries += [
+            asyncio.create_task(self._deliver("collection", ch_name, lambda c=ch_name: collection(c)))
+            for ch_name in col_targets if ch_name
+        ]
+        self._finish(post_id, deliveries)
+
+    @staticmethod
+    def _log_fanout(post_id: str, results):
+        """Log one line with per-channel delivery latency for a post."""
+        if not results:
+            return
+        parts = [
+            f"{kind[0].upper()}:#{ch_name} {seconds:.1f}s{'' if ok else ' ✗'}"
+            for kind, ch_name, seconds, ok in sorted(results, key=lambda r: -r[2])
+        ]
+        failed = sum(1 for r in results if not r[3])
+        logger.info(
+            f"⏱️ Fan-out for {post_id}: {len(results) - failed}/{len(results)} delivered, "
+            f"slowest {max(r[2] for r in results):.1f}s | " + ", ".join(parts)
+        )
+
+    @staticmethod
+    def _budget_kwargs() -> dict:
+        """render_renditions arguments for the configured upload budget."""
+        return {
+            "full_format": cfg.image_format,
+            "full_max_dimension": cfg.image_max_dimension,
+            "max_bytes": cfg.image_max_bytes,
+            "quality": cfg.image_quality,
+        }
+
+    @staticmethod
+    def _budget_variant() -> str:
+        return f"{cfg.image_format}:{cfg.image_max_dimension}:{cfg.image_max_bytes}:q{cfg.image_quality}"
+
+    @staticmethod
+    def _extension(data: bytes) -> str:
+        return ".webp" if data[:4] == b"RIFF" and data[8:12] == b"WEBP" else ".jpg"
+
+    @staticmethod
+    def _kb(size: int) -> str:
+        return f"{size / 1024:.0f} KB"
+
+    async def _fit_collection(self, post_id: str, images, first: bytes = None):
+        """Re-encode album photos to the upload budget; originals are kept on failure."""
+        variant = f"full:{self._budget_variant()}"
+
+        async def fit(data, known=None):
+            if data is None or known is not None:
+                return known or data
+            data = bytes(data)
+            try:
+                renditions = await self.variants.get(
+                    data, variant,
+                    lambda: render_renditions_async(data, executor=self.image_executor, **self._budget_kwargs()),
+                )
+            except Exception as e:
+                logger.error(f"Failed to re-encode image of {post_id}: {e}")
+                return data
+            return renditions.get("full", data)
+
+        fitted = await asyncio.gather(*(fit(b, first if i == 0 else None) for i, b in enumerate(images)))
+        before = sum(len(b) for b in images if b is not None)
+        after = sum(len(b) for b in fitted if b is not None)
+        if before != after:
+            logger.info(f"🗜️ Collection {post_id}: {len(images)} images {self._kb(before)} → {self._kb(after)}")
+        return fitted
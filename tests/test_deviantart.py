@@ -157,15 +157,15 @@ async def test_poll_cycle():
     # Mock callback
     posts_received = []
     async def on_new_post(service_obj, deviation):
-        title = deviation.get("title", "Unknown")
+        title = deviation.title
         posts_received.append({
             "service": service_obj.username,
             "title": title,
-            "url": deviation.get("url", "#")
+            "url": deviation.url
         })
         print(f"\n🎨 Новый пост получен:")
         print(f"   Название: {title}")
-        print(f"   URL: {deviation.get('url', '#')}")
+        print(f"   URL: {deviation.url}")
     
     try:
         print("\n⏳ Запуск одного цикла опроса (это займет несколько секунд)...")
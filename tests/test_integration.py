@@ -116,17 +116,9 @@ async def test_with_mock_discord():
                 # Simulate posting to Discord
                 print(f"\n📤 Отправка в Discord...")
                 for i, deviation in enumerate(new_entries[:2], 1):  # Show first 2
-                    title = deviation.get("title", "No title")
-                    url = deviation.get("url", "#")
-                    thumbs = deviation.get("thumbs", [])
-                    # thumbs is a list of dicts with 'src', 'height', 'width'
-                    thumb_url = None
-                    if thumbs:
-                        thumb_obj = thumbs[0]
-                        if isinstance(thumb_obj, dict):
-                            thumb_url = thumb_obj.get("src")
-                        else:
-                            thumb_url = str(thumb_obj)
+                    title = deviation.title
+                    url = deviation.url
+                    thumb_url = deviation.thumb_url
                     
                     # Create embed
                     embed = MockEmbed(
@@ -142,7 +134,7 @@ async def test_with_mock_discord():
                     await mock_channel.send(embed=embed)
                     
                     # Update state
-                    ts = deviation.get("published_time") or deviation.get("date")
+                    ts = deviation.published_time
                     if ts:
                         await state.set(f"{username}:last_timestamp", ts)
                         await state.update("analytics:posts_sent", lambda v: (v or 0) + 1)
@@ -178,6 +170,7 @@ async def test_with_mock_discord():
         print("❌ ТЕСТ НЕ ПРОЙДЕН")
     print(f"{'='*70}\n")
     
+    await state.close()
     return all_ok
 
 
@@ -221,9 +214,9 @@ async def interactive_test():
                     
                     print(f"\n✅ Получено {len(entries)} постов:")
                     for i, e in enumerate(entries[:5], 1):
-                        print(f"\n{i}. {e.get('title', 'No title')}")
-                        print(f"   URL: {e.get('url')}")
-                        print(f"   Дата: {e.get('published_time', e.get('date'))}")
+                        print(f"\n{i}. {e.title}")
+                        print(f"   URL: {e.url}")
+                        print(f"   Дата: {e.published_time}")
             except (ValueError, IndexError):
                 print("❌ Неверный выбор")
         
@@ -242,6 +235,7 @@ async def interactive_test():
         
         elif choice == "4":
             print("👋 До встречи!")
+            await state.close()
             break
         
         else:
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для хранилищ состояния
+Проверяет журнал JSON-хранилища, миграцию в SQLite и транзакции во временной папке
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Добавить родительскую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.dedup import DedupIndex
+from bot.state import SQLiteStateStore, StateStore
+
+
+async def _in_tmp(check):
+    path = tempfile.mkdtemp(prefix="pixlive-state-")
+    try:
+        await check(path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def test_torn_journal_tail():
+    """Недописанная последняя запись журнала отбрасывается, остальные применяются."""
+    async def check(tmp):
+        path = os.path.join(tmp, "state.json")
+        store = StateStore(path, journal=True)
+        await store.set("last_seen", {"artist": 1})
+        await store.append("sent_posts", "https://example.com/a")
+        store._journal_file.close()
+        with open(store.journal_path, "a") as f:
+            f.write('{"s":3,"o":[{"k":"sent_posts","a":"https://exa')
+
+        reloaded = StateStore(path, journal=True)
+        assert await reloaded.get("last_seen") == {"artist": 1}
+        assert await reloaded.get("sent_posts") == ["https://example.com/a"]
+        await reloaded.close()
+        assert not os.path.exists(reloaded.journal_path)
+        print("✅ Оборванная запись журнала отброшена")
+    asyncio.run(_in_tmp(check))
+
+
+def test_replay_after_crash_during_compaction():
+    """Журнал, оставшийся после записи снимка, не применяется второй раз."""
+    async def check(tmp):
+        path = os.path.join(tmp, "state.json")
+        store = StateStore(path, journal=True)
+        for name in ("a", "b", "c"):
+            await store.append("sent_posts", f"https://example.com/{name}")
+        # Снимок уже записан, а журнал удалить не успели
+        store._data[StateStore.SEQ_KEY] = store._seq
+        await store._write(store._data)
+        store._journal_file.close()
+        assert os.path.exists(store.journal_path)
+
+        reloaded = StateStore(path, journal=True)
+        expected = [f"https://example.com/{name}" for name in ("a", "b", "c")]
+        assert await reloaded.get("sent_posts") == expected
+        await reloaded.append("sent_posts", "https://example.com/d")
+        await reloaded.close()
+
+        again = StateStore(path, journal=True)
+        assert await again.get("sent_posts") == expected + ["https://example.com/d"]
+        await again.close()
+        print("✅ Повторный запуск после сбоя не дублирует записи")
+    asyncio.run(_in_tmp(check))
+
+
+def test_migration_to_sqlite():
+    """Миграция переносит ключи, журнал и sent_posts из JSON в SQLite."""
+    async def check(tmp):
+        json_path = os.path.join(tmp, "state.json")
+        with open(json_path, "w") as f:
+            json.dump({
+                "last_seen": {"artist": 1},
+                "sent_posts": ["https://example.com/a", "patreon:42"],
+            }, f)
+        with open(f"{json_path}.journal", "w") as f:
+            f.write(json.dumps([{"k": "sent_posts", "a": "https://example.com/b"}]) + "\n")
+
+        store = SQLiteStateStore(os.path.join(tmp, "state.db"), migrate_from=json_path)
+        assert await store.get("last_seen") == {"artist": 1}
+        assert await store.has_sent("https://example.com/a")
+        assert await store.has_sent("https://example.com/b")
+        assert await store.sent_count() == 2
+        assert await store.sent_count("patreon") == 1
+        await store.close()
+
+        # Повторное открытие не импортирует данные ещё раз
+        with open(json_path, "w") as f:
+            json.dump({"last_seen": {"artist": 2}}, f)
+        reopened = SQLiteStateStore(os.path.join(tmp, "state.db"), migrate_from=json_path)
+        assert await reopened.get("last_seen") == {"artist": 1}
+        await reopened.close()
+        print("✅ Состояние перенесено в SQLite один раз")
+    asyncio.run(_in_tmp(check))
+
+
+def test_dedup_history_after_sqlite_switch():
+    """Ключи, записанные в режиме JSON, остаются дублями после перехода на SQLite."""
+    async def check(tmp):
+        json_path = os.path.join(tmp, "state.json")
+        bloom_path = os.path.join(tmp, "dedup-patreon.bloom")
+        store = StateStore(json_path, journal=True)
+        dedup = DedupIndex(store, "patreon", bloom_path, exact_prefix="patreon:", max_recent=1)
+        for post_id in ("1", "2", "3"):
+            await dedup.add(post_id)
+        await dedup.close()
+        await store.close()
+
+        store = SQLiteStateStore(os.path.join(tmp, "state.db"), migrate_from=json_path)
+        dedup = DedupIndex(store, "patreon", bloom_path, exact_prefix="patreon:", max_recent=1)
+        for post_id in ("1", "2", "3"):
+            assert await dedup.contains(post_id), post_id
+        assert not await dedup.contains("4")
+        await dedup.close()
+        await store.close()
+        print("✅ История дедупликации пережила переход на SQLite")
+    asyncio.run(_in_tmp(check))
+
+
+def test_transaction_rollback():
+    """Исключение в транзакции отменяет изменения и не вызывает on_commit."""
+    async def check(tmp):
+        stores = [
+            StateStore(os.path.join(tmp, "state.json"), journal=True),
+            SQLiteStateStore(os.path.join(tmp, "state.db")),
+        ]
+        for store in stores:
+            called = []
+            try:
+                async with store.transaction() as txn:
+                    await txn.set("last_seen", {"artist": 1})
+                    await txn.mark_sent("https://example.com/a")
+                    txn.on_commit(lambda: called.append(True))
+                    raise RuntimeError("delivery failed")
+            except RuntimeError:
+                pass
+            assert await store.get("last_seen") is None
+            assert not await store.has_sent("https://example.com/a")
+            assert not called
+
+            async with store.transaction() as txn:
+                await txn.set("last_seen", {"artist": 1})
+                txn.on_commit(lambda: called.append(True))
+            assert await store.get("last_seen") == {"artist": 1}
+            assert called == [True]
+            await store.close()
+        print("✅ Откат транзакции отбрасывает изменения и on_commit")
+    asyncio.run(_in_tmp(check))
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("💾 ТЕСТ ХРАНИЛИЩ СОСТОЯНИЯ")
+    print("=" * 70)
+    test_torn_journal_tail()
+    test_replay_after_crash_during_compaction()
+    test_migration_to_sqlite()
+    test_dedup_history_after_sqlite_switch()
+    test_transaction_rollback()
+    print("\n✅ Все проверки пройдены")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для отправки через вебхуки Discord
+Поднимает локальный HTTP-сервер вместо Discord, токены и сеть не нужны
+"""
+import asyncio
+import io
+import json
+import sys
+import os
+
+# Добавить родительскую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from aiohttp import web
+from bot.webhook import WebhookChannel, WebhookError, WebhookSender
+from services.http_client import HttpClient
+
+
+class FakeDiscord:
+    """Локальная замена API вебхуков Discord."""
+
+    def __init__(self, rate_limit_first: int = 0):
+        self.messages = []
+        self.rate_limit_first = rate_limit_first
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_post("/api/webhooks/{id}/{token}", self.execute)
+        self.runner = None
+        self.base = None
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def url(self, webhook_id: int = 123, token: str = "secret-token"):
+        return f"{self.base}/api/webhooks/{webhook_id}/{token}"
+
+    async def execute(self, request: web.Request):
+        self.requests += 1
+        if request.match_info["token"] != "secret-token":
+            return web.json_response({"message": "Unknown Webhook"}, status=404)
+        if self.rate_limit_first > 0:
+            self.rate_limit_first -= 1
+            return web.json_response({"retry_after": 0.05, "global": False}, status=429)
+
+        files = []
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            payload = {}
+            async for part in reader:
+                if part.name == "payload_json":
+                    payload = json.loads(await part.text())
+                else:
+                    files.append((part.filename, len(await part.read())))
+        else:
+            payload = await request.json()
+
+        message_id = len(self.messages) + 1
+        self.messages.append({"payload": payload, "files": files, "wait": request.query.get("wait")})
+        return web.json_response(
+            {
+                "id": str(message_id),
+                "attachments": [
+                    {"id": str(i), "filename": name, "url": f"{self.base}/attachments/{message_id}/{name}"}
+                    for i, (name, _) in enumerate(files)
+                ],
+            },
+            headers={"X-RateLimit-Remaining": "4", "X-RateLimit-Reset-After": "1.0"},
+        )
+
+
+async def _with_server(check, **kwargs):
+    server = FakeDiscord(**kwargs)
+    await server.start()
+    http = HttpClient()
+    try:
+        return await check(server, WebhookSender(http))
+    finally:
+        await http.close()
+        await server.stop()
+
+
+def test_embed_message():
+    """Сообщение с embed уходит JSON-ом."""
+    async def check(server, sender):
+        channel = WebhookChannel(sender, "posts", server.url())
+        embed = discord.Embed(title="Hello", url="https://example.com", color=0x0000FF)
+        await channel.send(embed=embed)
+        sent = server.messages[0]
+        assert sent["wait"] == "true"
+        assert sent["payload"]["embeds"][0]["title"] == "Hello"
+        print("✅ Embed отправлен через вебхук")
+    asyncio.run(_with_server(check))
+
+
+def test_files_and_attachment_urls():
+    """Файлы уходят multipart-ом, ссылки на вложения возвращаются."""
+    async def check(server, sender):
+        channel = WebhookChannel(sender, "collections", server.url())
+        files = [discord.File(io.BytesIO(b"x" * 100), filename=f"img_{i}.jpg") for i in range(3)]
+        message = await channel.send(files=files)
+        sent = server.messages[0]
+        assert sent["files"] == [(f"img_{i}.jpg", 100) for i in range(3)]
+        assert [a["filename"] for a in sent["payload"]["attachments"]] == ["img_0.jpg", "img_1.jpg", "img_2.jpg"]
+        assert message.attachments[2].url.endswith("/img_2.jpg")
+        print(f"✅ {len(files)} файла загружены, ссылки получены")
+    asyncio.run(_with_server(check))
+
+
+def test_rate_limit_retry():
+    """После 429 запрос повторяется."""
+    async def check(server, sender):
+        channel = WebhookChannel(sender, "posts", server.url())
+        await channel.send(content="after 429")
+        assert server.requests == 3 and sender.rate_limited == 2
+        assert server.messages[0]["payload"]["content"] == "after 429"
+        print("✅ 429 обработан, сообщение доставлено")
+    asyncio.run(_with_server(check, rate_limit_first=2))
+
+
+def test_unknown_webhook():
+    """Удалённый вебхук даёт 404 и вызывает on_gone."""
+    async def check(server, sender):
+        gone = []
+
+        async def on_gone():
+            gone.append(True)
+
+        channel = WebhookChannel(sender, "posts", server.url(token="deleted"), on_gone=on_gone)
+        try:
+            await channel.send(content="lost")
+        except WebhookError as e:
+            assert e.status == 404 and gone
+            print("✅ 404 от вебхука обработан")
+        else:
+            raise AssertionError("expected WebhookError")
+    asyncio.run(_with_server(check))
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🔧 ТЕСТ ВЕБХУКОВ DISCORD (локальный сервер)")
+    print("=" * 70)
+    test_embed_message()
+    test_files_and_attachment_urls()
+    test_rate_limit_retry()
+    test_unknown_webhook()
+    print("\n✅ Все проверки пройдены")
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def _timed(fn, args, kwargs):
+    """Runs in the worker: returns the result and how long the job itself took."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class ImageExecutor:
+    """Runs CPU-bound Pillow work away from the event loop.
+
+    Uses a process pool (one worker per core by default, started with
+    ``spawn`` so workers don't inherit the bot's threads and sockets). If a
+    process pool cannot be created or breaks, it falls back to a thread pool,
+    where Pillow still releases the GIL for most decode/filter/encode work.
+    Jobs must be picklable module-level functions.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, use_processes: bool = True):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self._pool: Optional[Executor] = None
+        self.mode = None
+        self.pending = 0
+        self.jobs = 0
+        self.failed = 0
+        self._run_times = deque(maxlen=200)
+        self._wait_times = deque(maxlen=200)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.use_processes:
+                try:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                    self.mode = "process"
+                except (OSError, NotImplementedError, ValueError) as e:
+                    logger.warning(f"Process pool unavailable ({e}), using threads for image work")
+                    self.use_processes = False
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image")
+                self.mode = "thread"
+            logger.info(f"🖼️ Image executor: {self.max_workers} {self.mode} workers")
+        return self._pool
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` in the pool and return its result."""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            try:
+                result, elapsed = await loop.run_in_executor(self._get_pool(), partial(_timed, fn, args, kwargs))
+            except BrokenProcessPool:
+                logger.error("Image process pool broke, falling back to threads")
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.use_processes = False
+                result, elapsed = await loop.run_in_executor(self._get_pool(), partial(_timed, fn, args, kwargs))
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        total = time.perf_counter() - submitted
+        self.jobs += 1
+        self._run_times.append(elapsed)
+        self._wait_times.append(max(0.0, total - elapsed))
+        return result
+
+    def stats(self) -> dict:
+        runs = self._run_times
+        waits = self._wait_times
+        return {
+            "mode": self.mode or ("process" if self.use_processes else "thread"),
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "avg_ms": round(1000 * sum(runs) / len(runs)) if runs else 0,
+            "max_ms": round(1000 * max(runs)) if runs else 0,
+            "avg_wait_ms": round(1000 * sum(waits) / len(waits)) if waits else 0,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
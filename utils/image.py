@@ -1,4 +1,5 @@
 from PIL import Image, ImageFilter
+import asyncio
 import io
 
 def blur_image(image_bytes: bytes, radius: int = 40) -> bytes:
@@ -17,15 +18,7 @@ def blur_image(image_bytes: bytes, radius: int = 40) -> bytes:
 
     try:
         with Image.open(io.BytesIO(image_bytes)) as img:
-            # Convert to RGB to handle PNGs with transparency or other modes
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-                
-            blurred = img.filter(ImageFilter.GaussianBlur(radius))
-            
-            output = io.BytesIO()
-            blurred.save(output, format='JPEG', quality=85)
-            return output.getvalue()
+            return _full_blur(img, radius)
     except Exception as e:
         # If blurring fails, return original or re-raise? 
         # For safety/simplicity, logging error and returning original might be risky if it was NSFW.
@@ -33,3 +26,225 @@ def blur_image(image_bytes: bytes, radius: int = 40) -> bytes:
         # Let's re-raise or return empty.
         print(f"Error blurring image: {e}")
         raise e
+
+
+def fast_blur_image(image_bytes: bytes, radius: int = 40, preview_width: int = 1280,
+                    work_radius: float = 8.0, quality: int = 85) -> bytes:
+    """
+    Blurs an image as heavily as blur_image, at a fraction of the cost.
+
+    A strong blur removes all fine detail, so the image is decoded at reduced
+    scale (JPEG draft mode), blurred at low resolution with the radius scaled
+    down by the same factor and then resized to the preview width.
+
+    Args:
+        image_bytes: The input image data in bytes.
+        radius: Blur radius relative to the full-resolution image.
+        preview_width: Maximum width of the returned preview.
+        work_radius: Radius the blur is performed at; smaller is faster.
+        quality: JPEG quality of the result.
+
+    Returns:
+        bytes: The blurred preview in JPEG format.
+    """
+    if not image_bytes:
+        return image_bytes
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        size = img.size
+        # Lets libjpeg decode at 1/2, 1/4 or 1/8 scale (no-op for other formats)
+        img.draft('RGB', _blur_work_size(size, radius, work_radius))
+        preview = _blurred_preview(img, size, radius, preview_width, work_radius)
+    return _encode(preview, 'JPEG', quality)
+
+
+def _full_blur(img, radius):
+    """blur_image's output for an opened image: full resolution, JPEG quality 85."""
+    # Convert to RGB to handle PNGs with transparency or other modes
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    blurred = img.filter(ImageFilter.GaussianBlur(radius))
+
+    output = io.BytesIO()
+    blurred.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+def _fit_width(size, width):
+    """Size scaled down (never up) to at most ``width`` pixels wide."""
+    if width <= 0 or size[0] <= width:
+        return size
+    return width, max(1, round(size[1] * width / size[0]))
+
+
+def _blur_work_size(size, radius, work_radius):
+    # Working scale at which the blur radius becomes work_radius
+    scale = min(1.0, work_radius / radius) if radius > 0 else 1.0
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _rgb(img):
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def _blurred_preview(img, size, radius, preview_width, work_radius):
+    """Blur an already opened (possibly draft-decoded) image of original ``size``."""
+    work_size = _blur_work_size(size, radius, work_radius)
+    img = _rgb(img)
+    small = img.resize(work_size, Image.BOX) if img.size != work_size else img.copy()
+    blurred = small.filter(ImageFilter.GaussianBlur(radius * work_size[0] / size[0]))
+    return blurred.resize(_fit_width(size, preview_width), Image.BICUBIC)
+
+
+def _format_name(fmt):
+    """Pillow format name for 'jpeg'/'jpg'/'webp'; '' stays ''."""
+    name = {'JPG': 'JPEG'}.get(fmt.upper(), fmt.upper())
+    if name not in ('', 'JPEG', 'WEBP'):
+        raise ValueError(f"Unsupported image format: {fmt}")
+    return name
+
+
+def _encode(img, fmt='JPEG', quality=85):
+    output = io.BytesIO()
+    if fmt.upper() == 'WEBP':
+        img.save(output, format='WEBP', quality=quality, method=2)
+    else:
+        img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _encode_to_budget(img, fmt='JPEG', quality=85, max_bytes=0, min_quality=40):
+    """Encode at ``quality``; if over ``max_bytes``, search a lower quality, then downscale."""
+    data = _encode(img, fmt, quality)
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+
+    top = quality - 1
+    while True:
+        # Highest quality in [min_quality, top] that fits
+        lo, hi, best = min_quality, top, None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            data = _encode(img, fmt, mid)
+            if len(data) <= max_bytes:
+                best, lo = data, mid + 1
+            else:
+                hi = mid - 1
+        if best is not None:
+            return best
+        data = _encode(img, fmt, min_quality)
+        if max(img.size) <= 64:
+            return data
+        # Scale so the area shrinks roughly in proportion to the overshoot
+        factor = max(0.5, min(0.9, (max_bytes / len(data)) ** 0.5))
+        img = img.resize((max(1, int(img.width * factor)), max(1, int(img.height * factor))), Image.LANCZOS)
+        top = quality
+
+
+def render_renditions(image_bytes: bytes, blur_radius: int = 0, preview_width: int = 1280,
+                      work_radius: float = 8.0, thumb_width: int = 0, full_max_dimension: int = 0,
+                      full_format: str = '', quality: int = 85, max_bytes: int = 0,
+                      exact_blur: bool = False) -> dict:
+    """
+    Decodes an image once and produces every rendition asked for.
+
+    The image is decoded a single time, at the lowest scale the requested
+    renditions allow (JPEG draft mode), and all renditions are derived from
+    that one decoded image.
+
+    Args:
+        image_bytes: The input image data in bytes.
+        blur_radius: Blur radius at full resolution; 0 skips the blurred preview.
+        preview_width: Maximum width of the blurred preview.
+        work_radius: Radius the blur is performed at (as in fast_blur_image).
+        thumb_width: Width of the thumbnail; 0 skips it.
+        full_max_dimension: Downscale a larger full image to this size; 0 keeps it.
+        full_format: 'JPEG' or 'WEBP' for a re-encoded full image; '' keeps the source format.
+        quality: Encoder quality for re-encoded renditions (the starting point with max_bytes).
+        max_bytes: Byte budget per rendition; quality, then size, is lowered to meet it. 0 = none.
+        exact_blur: Make the blurred rendition exactly as blur_image does (full
+            resolution, no resize or budget) instead of the fast preview.
+
+    Returns:
+        dict: 'full' (only when it had to be re-encoded), 'blurred' and 'thumb', as requested.
+    """
+    renditions = {}
+    if not image_bytes:
+        return renditions
+    full_format = _format_name(full_format)
+
+    with Image.open(io.BytesIO(image_bytes)) as src:
+        size = src.size
+        # The full image is only re-encoded when it breaks a limit or must change format
+        reencode_full = bool(
+            (full_max_dimension and max(size) > full_max_dimension)
+            or (max_bytes and len(image_bytes) > max_bytes)
+            or (full_format and full_format.upper() != (src.format or '').upper())
+        )
+        if not (reencode_full or blur_radius or thumb_width):
+            return renditions
+        if not reencode_full and not (blur_radius and exact_blur):
+            # Only reduced renditions are needed: decode just large enough for them
+            needed = [_fit_width(size, thumb_width)] if thumb_width else []
+            if blur_radius:
+                needed.append(_blur_work_size(size, blur_radius, work_radius))
+            src.draft('RGB', max(needed))
+        img = _rgb(src)
+
+        if reencode_full:
+            full = img
+            if full_max_dimension and max(img.size) > full_max_dimension:
+                ratio = full_max_dimension / max(img.size)
+                full_size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+                full = img.resize(full_size, Image.LANCZOS, reducing_gap=2.0)
+            fmt = full_format or ('WEBP' if src.format == 'WEBP' else 'JPEG')
+            renditions['full'] = _encode_to_budget(full, fmt, quality, max_bytes)
+        if blur_radius and exact_blur:
+            renditions['blurred'] = _full_blur(img, blur_radius)
+        elif blur_radius:
+            preview = _blurred_preview(img, size, blur_radius, preview_width, work_radius)
+            renditions['blurred'] = _encode_to_budget(preview, 'JPEG', quality, max_bytes)
+        if thumb_width:
+            thumb = img.resize(_fit_width(img.size, thumb_width), Image.LANCZOS, reducing_gap=2.0)
+            renditions['thumb'] = _encode(thumb, 'JPEG', quality)
+    return renditions
+
+
+def shrink_image(image_bytes: bytes, max_bytes: int, quality: int = 85, min_quality: int = 50) -> bytes:
+    """
+    Re-encodes an image as JPEG so that it fits in max_bytes.
+
+    Lowers the JPEG quality first and then downscales the image step by step.
+
+    Args:
+        image_bytes: The input image data in bytes.
+        max_bytes: The size the result must not exceed.
+        quality: Initial JPEG quality.
+        min_quality: Quality at which to start downscaling instead.
+
+    Returns:
+        bytes: The image data, unchanged if it already fits.
+    """
+    if len(image_bytes) <= max_bytes:
+        return image_bytes
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return _encode_to_budget(_rgb(img), 'JPEG', quality, max_bytes, min_quality)
+
+
+async def _run(executor, fn, *args, **kwargs):
+    # ImageExecutor when given, otherwise the loop's default thread pool
+    if executor is None:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return await executor.run(fn, *args, **kwargs)
+
+
+async def render_renditions_async(image_bytes: bytes, executor=None, **kwargs) -> dict:
+    """render_renditions without blocking the event loop."""
+    return await _run(executor, render_renditions, image_bytes, **kwargs)
+
+
+async def shrink_image_async(image_bytes: bytes, max_bytes: int, executor=None) -> bytes:
+    """shrink_image without blocking the event loop."""
+    return await _run(executor, shrink_image, image_bytes, max_bytes)
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple, Union
+
+
+logger = logging.getLogger(__name__)
+
+
+class VariantCache:
+    """Renditions of an image (blurred preview, ...), computed at most once.
+
+    Entries are keyed by the SHA-256 of the source bytes plus a variant name
+    that encodes the parameters (e.g. ``blur:80:fast:1280``), so the same
+    photo forwarded to several channels, retried or re-forwarded later reuses
+    the earlier result. Concurrent requests share one computation. The cache
+    is an LRU bounded by entry count and total bytes. A value is either bytes
+    or a dict of rendition name -> bytes, as returned by
+    ``utils.image.render_renditions``.
+    """
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Union[bytes, dict]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    async def get(self, data: bytes, variant: str, compute: Callable[[], Awaitable[Union[bytes, dict]]],
+                  source_key: str = None) -> Union[bytes, dict]:
+        """Return ``variant`` of ``data``, awaiting ``compute()`` only on a miss."""
+        key = (source_key or self.key(data), variant)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+        except BaseException as e:
+            del self._pending[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved: there may be no other waiter to see it
+                future.exception()
+            raise
+        del self._pending[key]
+        future.set_result(result)
+        self._store(key, result)
+        return result
+
+    @staticmethod
+    def _size(value: Union[bytes, dict]) -> int:
+        if isinstance(value, dict):
+            return sum(len(v) for v in value.values())
+        return len(value)
+
+    def _store(self, key: Tuple[str, str], value: Union[bytes, dict]):
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }